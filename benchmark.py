@@ -0,0 +1,431 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import timeit
+
+from argparse import ArgumentParser
+from copy import deepcopy
+
+import numpy as np
+
+from config import load_config
+
+MODEL_PATH = [
+    "weights/rl_model_v1_10000000_steps.zip",
+    "weights/rl_model_v6_10000000_steps.zip"
+]
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=False,
+        default="configs/game_config.yml"
+    )
+    parser.add_argument("--only", type=str, nargs="*", default=None, help="run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, noisier numbers")
+    parser.add_argument("--output", type=str, default="logs/benchmark.json")
+    parser.add_argument("--baseline", type=str, default="logs/benchmark_baseline.json")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="relative slowdown against the baseline that counts as a regression"
+    )
+
+    return parser.parse_args()
+
+
+def per_call(fn, number, repeat=5):
+    # best-of-`repeat` seconds per call, the least noisy estimate on a shared machine
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def metric(value, unit, higher_is_better):
+    return {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def fresh_interpreter(code, repeat=3):
+    # best-of wall time of a new interpreter running `code`, so no module is already
+    # imported; also returns its last stdout line
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, (result.stdout.strip().splitlines() or [""])[-1]
+
+
+SPAWN_WORKERS = """
+import time
+from functools import partial
+from env_worker import make_env
+from shm_vec_env import ShmSubprocVecEnv
+if __name__ == "__main__":
+    start = time.perf_counter()
+    env = ShmSubprocVecEnv([partial(make_env, {config!r}) for _ in range(4)])
+    env.reset()
+    print(time.perf_counter() - start)
+    env.close()
+"""
+
+
+def bench_startup(config_file, scale):
+    # cold imports, each in a fresh interpreter, and the time until 4 env workers are up
+    results = {}
+    repeat = 3 if scale > 1 else 1
+    python, _ = fresh_interpreter("pass", repeat)
+    results["startup_python_ms"] = metric(python * 1e3, "ms", False)
+    for module in ("gym_env", "game", "train"):
+        seconds, _ = fresh_interpreter(f"import {module}", repeat)
+        results[f"startup_import_{module}_ms"] = metric((seconds - python) * 1e3, "ms", False)
+    _, spawn = fresh_interpreter(SPAWN_WORKERS.format(config=config_file), repeat)
+    results["startup_spawn_4_workers_ms"] = metric(float(spawn) * 1e3, "ms", False)
+    return results
+
+
+def bench_env(config_file, scale):
+    from gym_env import GameEnv
+
+    results = {}
+    env = GameEnv(config_file)
+    results["env_reset_us"] = metric(per_call(env.reset, 200 * scale) * 1e6, "us", False)
+
+    env.reset()
+    actions = iter(np.random.default_rng(0).integers(5, size=10 ** 7))
+
+    def step():
+        _, _, done, truncated, _ = env.step(next(actions))
+        if done or truncated:
+            env.reset()
+
+    results["env_steps_per_sec"] = metric(1 / per_call(step, 500 * scale), "steps/s", True)
+    results["env_get_obs_us"] = metric(per_call(env.get_obs, 2000 * scale) * 1e6, "us", False)
+    return results
+
+
+def bench_frame_skip(config_file, scale):
+    # 5 repeats x 20 physics ticks per step, tick by tick and through the closed-form fast path
+    from gym_env import GameEnv
+
+    results = {}
+    for fast_step in (False, True):
+        env = GameEnv(config_file)
+        env.physics_ticks = 20
+        env.fast_step = fast_step
+        env.reset(seed=0)
+        actions = iter(np.random.default_rng(0).integers(5, size=10 ** 7))
+
+        def step():
+            _, _, done, truncated, _ = env.step(next(actions))
+            if done or truncated:
+                env.reset()
+
+        name = "fast" if fast_step else "ticked"
+        results[f"env_skip100_{name}_steps_per_sec"] = metric(1 / per_call(step, 50 * scale), "steps/s", True)
+    return results
+
+
+def bench_kernel(config_file, scale):
+    # GameEnv.step through kernel.run_block, interpreted and (when numba is installed) compiled
+    from gym_env import GameEnv
+    from kernel import jit_kernel, run_block_python
+
+    results = {}
+    kernels = {"python": run_block_python}
+    if jit_kernel() is not None:
+        kernels["numba"] = jit_kernel()
+    for name, kernel in kernels.items():
+        env = GameEnv(config_file)
+        env.kernel = kernel
+        env.reset(seed=0)
+        actions = iter(np.random.default_rng(0).integers(5, size=10 ** 7))
+
+        def step():
+            _, _, done, truncated, _ = env.step(next(actions))
+            if done or truncated:
+                env.reset()
+
+        # the first call compiles
+        step()
+        results[f"env_kernel_{name}_steps_per_sec"] = metric(1 / per_call(step, 500 * scale), "steps/s", True)
+    return results
+
+
+def bench_planning(config_file, scale):
+    # snapshot copies, and 256 branches expanded 10 steps at once from one snapshot
+    from gym_env import GameEnv
+    from planning import rollout_batch
+
+    env = GameEnv(config_file)
+    env.reset(seed=0)
+    state = env.get_state()
+    states = np.repeat(state[None], 256, axis=0)
+    actions = np.random.default_rng(0).integers(5, size=(256, 10))
+    rollout = per_call(lambda: rollout_batch(env, states, actions), 5 * scale)
+    return {
+        "get_state_us": metric(per_call(lambda: env.get_state(state), 2000 * scale) * 1e6, "us", False),
+        "set_state_us": metric(per_call(lambda: env.set_state(state), 2000 * scale) * 1e6, "us", False),
+        "rollout_branch_steps_per_sec": metric(actions.size / rollout, "steps/s", True),
+    }
+
+
+def bench_env_render(config_file, scale):
+    # the same env drawing every step headlessly: full rgb frames and 84x84x4 stacked pixels
+    from gym_env import GameEnv
+
+    results = {}
+    actions = iter(np.random.default_rng(0).integers(5, size=10 ** 7))
+
+    env = GameEnv(config_file, render_mode="rgb_array")
+    env.reset()
+
+    def step_render():
+        _, _, done, truncated, _ = env.step(next(actions))
+        env.render()
+        if done or truncated:
+            env.reset()
+
+    results["env_rgb_array_steps_per_sec"] = metric(1 / per_call(step_render, 50 * scale), "steps/s", True)
+
+    env = GameEnv(config_file, obs_type="pixels", frame_size=(84, 84), grayscale=True, frame_stack=4)
+    env.reset()
+
+    def step_pixels():
+        _, _, done, truncated, _ = env.step(next(actions))
+        if done or truncated:
+            env.reset()
+
+    results["env_pixels_steps_per_sec"] = metric(1 / per_call(step_pixels, 50 * scale), "steps/s", True)
+    return results
+
+
+def bench_vec_env(config_file, scale):
+    from vec_env import VecGameEnv
+
+    results = {}
+    for num_envs in (16, 256):
+        env = VecGameEnv(config_file, num_envs=num_envs)
+        env.reset()
+        actions = np.random.default_rng(0).integers(5, size=(num_envs,))
+        seconds = per_call(lambda: env.step(actions), 20 * scale)
+        results[f"vec_env_{num_envs}_env_steps_per_sec"] = metric(num_envs / seconds, "steps/s", True)
+    return results
+
+
+def bench_multi_agent(config_file, scale):
+    from multi_agent_env import MultiGameEnv
+
+    results = {}
+    for n_agents in (2, 32):
+        env = MultiGameEnv(config_file, n_agents=n_agents)
+        env.reset(seed=0)
+        actions = np.random.default_rng(0).integers(5, size=(n_agents,))
+
+        def step():
+            env.step_batch(actions)
+            if not env.alive.any():
+                env.reset()
+
+        seconds = per_call(step, 20 * scale)
+        results[f"multi_agent_{n_agents}_agent_steps_per_sec"] = metric(n_agents / seconds, "steps/s", True)
+    return results
+
+
+def bench_collisions(config_file, scale):
+    from collision import CollisionGrid
+    from entities import EntityStore
+    from player import Player
+    from target import Target
+
+    config = load_config(config_file)
+
+    results = {}
+    rng = np.random.default_rng(0)
+    player = Player(**deepcopy(config["player"]))
+    for n_items in (1, 10, 100, 1000):
+        store = EntityStore()
+        targets = [Target(rng.integers(100, 700, size=(2,)), (80, 80), store=store) for _ in range(n_items)]
+        index = CollisionGrid.from_items(targets, store=store)
+        points = iter(rng.uniform(0, 800, size=(10 ** 6, 2)).tolist())
+
+        def check_loop():
+            player.pos = next(points)
+            player.check_points(targets)
+
+        def check_grid():
+            player.pos = next(points)
+            player.check_points(targets, index)
+
+        number = max(10, 2000 * scale // n_items)
+        results[f"collision_loop_{n_items}_us"] = metric(per_call(check_loop, number) * 1e6, "us", False)
+        results[f"collision_grid_{n_items}_us"] = metric(per_call(check_grid, 200 * scale) * 1e6, "us", False)
+    return results
+
+
+def bench_dqn_act(config_file, scale):
+    from observation import OBS_SIZE
+    from player import DQNPlayer
+
+    config = load_config(config_file)
+
+    results = {}
+    start = time.perf_counter()
+    players = [DQNPlayer(**deepcopy(config["player"]), model_path=MODEL_PATH) for _ in range(8)]
+    results["dqn_player_build_s"] = metric(time.perf_counter() - start, "s", False)
+
+    obs = np.random.default_rng(0).normal(size=(8, OBS_SIZE)).astype(np.float32)
+    obs[:, -1] = 80.0
+    results["dqn_act_us"] = metric(per_call(lambda: players[0].act(obs[0]), 500 * scale) * 1e6, "us", False)
+    results["dqn_act_batch_8_us"] = metric(
+        per_call(lambda: DQNPlayer.act_batch(players, obs), 500 * scale) * 1e6, "us", False
+    )
+    return results
+
+
+def bench_game_render(config_file, scale):
+    # one frame of game.main's draw path with both planes moving, without the event loop
+    # and clock: dirty rectangles, the full redraw, and dirty rectangles with 100 stars
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+
+    import game
+    from renderer import DirtyRenderer
+    from target import Target
+    from timer import CountdownTimer
+
+    config = load_config(config_file)
+
+    width, height = config["view"]["width"], config["view"]["height"]
+    font, _, screen, _ = game.init_game(width, height)
+    timer = CountdownTimer(config["game"]["time_limit"], font)
+    targets, pickups, players, bar, bar2, t = game.get_game_elements(config)
+    many = targets + [
+        Target(pos=pos, size=(80, 80), render=True) for pos in np.random.default_rng(0).integers(100, 700, size=(99, 2))
+    ]
+    frames = iter(range(10 ** 7))
+
+    def frame(renderer, targets, full=False):
+        n = next(frames)
+        for player in players:
+            player.env_act(n % 5)
+            player.update((width, height))
+        t = 1000 * n / config["game"]["fps"]
+        game.draw_frame(renderer, font, timer, targets, pickups, players, bar, bar2, t)
+        if full:
+            renderer.invalidate()
+        pygame.display.update(renderer.render())
+
+    results = {}
+    for name, frame_targets, full in (("game_frame_us", targets, False), ("game_frame_full_us", targets, True),
+                                      ("game_frame_100_stars_us", many, False)):
+        renderer = DirtyRenderer(screen)
+        results[name] = metric(per_call(lambda: frame(renderer, frame_targets, full), 100 * scale) * 1e6, "us", False)
+    pygame.quit()
+    return results
+
+
+def bench_headless_match(config_file, scale):
+    # game.py --headless: 16 AI-vs-AI matches ticked in lockstep, one forward pass per tick
+    import game
+    from spawn import SpawnQueue
+
+    config = load_config(config_file)
+    matches = [game.Match(config, SpawnQueue.from_seed(idx), opponent="ai", render=False) for idx in range(16)]
+    obs_buf = np.empty((32, game.OBS_SIZE), dtype=np.float32)
+
+    def tick():
+        game.act_ai(matches, obs_buf)
+        for match in matches:
+            if match.done == 0:
+                match.tick()
+
+    return {"headless_match_ticks_per_sec": metric(len(matches) / per_call(tick, 50 * scale), "ticks/s", True)}
+
+
+BENCHMARKS = {
+    "startup": bench_startup,
+    "env": bench_env,
+    "frame_skip": bench_frame_skip,
+    "kernel": bench_kernel,
+    "planning": bench_planning,
+    "env_render": bench_env_render,
+    "vec_env": bench_vec_env,
+    "multi_agent": bench_multi_agent,
+    "collisions": bench_collisions,
+    "dqn_act": bench_dqn_act,
+    "game_render": bench_game_render,
+    "headless_match": bench_headless_match,
+}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"{'metric':40s} {'value':>14s} {'baseline':>14s} {'change':>8s}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:40s} {current['value']:14.2f} {'-':>14s}")
+            continue
+        ratio = current["value"] / previous["value"] if previous["value"] else 1.0
+        # >1 means better, whichever direction the metric goes
+        speedup = ratio if current["higher_is_better"] else 1 / max(ratio, 1e-12)
+        flag = ""
+        if speedup < 1 - tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:40s} {current['value']:14.2f} {previous['value']:14.2f} {speedup:7.2f}x{flag}")
+    return regressions
+
+
+def main():
+
+    args = parse_args()
+    scale = 1 if args.quick else 5
+    names = args.only or list(BENCHMARKS)
+
+    results = {}
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        results.update(BENCHMARKS[name](args.config, scale))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as fout:
+        json.dump(report, fout, indent=2)
+
+    baseline = {}
+    if os.path.isfile(args.baseline):
+        with open(args.baseline, "r") as fin:
+            baseline = json.load(fin)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as fout:
+            json.dump(report, fout, indent=2)
+        print(f"baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
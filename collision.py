@@ -0,0 +1,219 @@
+import math
+
+import numpy as np
+
+
+class CollisionGrid:
+    # uniform grid over the toroidal world: positions and distances wrap around
+    # the screen edges the same way Player.update wraps the plane. Built over an
+    # EntityStore, the keys are its entities, a grid slot is the entity's store row and
+    # positions and radii are read from the store's arrays instead of being copied
+
+    def __init__(self, size=(800, 800), cell_size=80, capacity=64, store=None):
+        self.size = size
+        self.cell_size = cell_size
+        self.n_cols = max(1, int(math.ceil(size[0] / cell_size)))
+        self.n_rows = max(1, int(math.ceil(size[1] / cell_size)))
+        self.store = store
+
+        # pos/radius rows of the keys when there is no store to read them from
+        own = capacity if store is None else 0
+        if store is not None:
+            capacity = store.capacity
+        self.cells = {}
+        self.keys = [None] * capacity
+        self.own_pos = np.zeros((own, 2), dtype=np.float64)
+        self.own_radius = np.zeros(own, dtype=np.float64)
+        self.item_cells = [()] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.slot_of = {}
+        # position of every key in the caller's item list, so queries return list indices
+        self.index_of = {}
+        # cells flattened for query_batch, rebuilt after the grid changes
+        self.flat = None
+
+    @classmethod
+    def from_items(cls, items, size=(800, 800), cell_size=80, store=None):
+        grid = cls(size, cell_size, capacity=max(64, len(items)), store=store)
+        for item in items:
+            grid.insert(item, item.pos, item.size[0] / 2)
+        grid.reindex(items)
+        return grid
+
+    @property
+    def pos(self):
+        return self.own_pos if self.store is None else self.store.pos
+
+    @property
+    def radius(self):
+        return self.own_radius if self.store is None else self.store.radius
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, key):
+        return key in self.slot_of
+
+    def _grow(self):
+        capacity = len(self.keys)
+        self.keys.extend([None] * capacity)
+        self.item_cells.extend([()] * capacity)
+        if self.store is None:
+            self.own_pos = np.concatenate([self.own_pos, np.zeros_like(self.own_pos)])
+            self.own_radius = np.concatenate([self.own_radius, np.zeros_like(self.own_radius)])
+            self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def _cell(self, x, y):
+        col = int(x // self.cell_size) % self.n_cols
+        row = int(y // self.cell_size) % self.n_rows
+        return row * self.n_cols + col
+
+    def _covered_cells(self, x, y, radius):
+        col0 = int(math.floor((x - radius) / self.cell_size))
+        col1 = int(math.floor((x + radius) / self.cell_size))
+        row0 = int(math.floor((y - radius) / self.cell_size))
+        row1 = int(math.floor((y + radius) / self.cell_size))
+        cols = {col % self.n_cols for col in range(col0, min(col1, col0 + self.n_cols - 1) + 1)}
+        rows = {row % self.n_rows for row in range(row0, min(row1, row0 + self.n_rows - 1) + 1)}
+        return tuple(row * self.n_cols + col for row in rows for col in cols)
+
+    def insert(self, key, pos, radius):
+        if key in self.slot_of:
+            self.remove(key)
+        x = float(pos[0]) % self.size[0]
+        y = float(pos[1]) % self.size[1]
+        if self.store is not None:
+            # the store already holds pos and radius in the entity's row
+            slot = key.slot
+            while slot >= len(self.keys):
+                self._grow()
+        else:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.own_pos[slot] = (x, y)
+            self.own_radius[slot] = radius
+
+        self.keys[slot] = key
+        self.slot_of[key] = slot
+
+        cells = self._covered_cells(x, y, radius)
+        self.item_cells[slot] = cells
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(slot)
+        self.flat = None
+        return slot
+
+    def remove(self, key):
+        slot = self.slot_of.pop(key)
+        for cell in self.item_cells[slot]:
+            members = self.cells[cell]
+            members.remove(slot)
+            if not members:
+                del self.cells[cell]
+        self.keys[slot] = None
+        self.item_cells[slot] = ()
+        if self.store is None:
+            self.free.append(slot)
+        self.index_of.pop(key, None)
+        self.flat = None
+
+    def reindex(self, items):
+        # items is the caller's list in its current order
+        self.index_of = {item: idx for idx, item in enumerate(items)}
+
+    def move(self, key, pos):
+        radius = self.radius[self.slot_of[key]]
+        idx = self.index_of.get(key)
+        self.remove(key)
+        self.insert(key, pos, radius)
+        if idx is not None:
+            self.index_of[key] = idx
+
+    def _wrapped_dist(self, x, y, slot):
+        dx = abs(x - self.pos[slot, 0])
+        dy = abs(y - self.pos[slot, 1])
+        dx = min(dx, self.size[0] - dx)
+        dy = min(dy, self.size[1] - dy)
+        return math.sqrt(dx * dx + dy * dy)
+
+    def query(self, pos, radius=0.0):
+        # keys of every item whose circle (grown by `radius`) contains pos
+        x = float(pos[0]) % self.size[0]
+        y = float(pos[1]) % self.size[1]
+        if radius:
+            candidates = set()
+            for cell in self._covered_cells(x, y, radius):
+                candidates.update(self.cells.get(cell, ()))
+        else:
+            candidates = self.cells.get(self._cell(x, y), ())
+
+        return [
+            self.keys[slot] for slot in sorted(candidates)
+            if self._wrapped_dist(x, y, slot) <= self.radius[slot] + radius
+        ]
+
+    def query_indices(self, pos, radius=0.0):
+        # like query, as ascending indices into the list last passed to reindex
+        return sorted(self.index_of[key] for key in self.query(pos, radius))
+
+    def _flat_cells(self):
+        # (start, count) per cell into one array of slots
+        if self.flat is None:
+            counts = np.zeros(self.n_rows * self.n_cols, dtype=np.int64)
+            members = []
+            for cell in sorted(self.cells):
+                counts[cell] = len(self.cells[cell])
+                members.extend(self.cells[cell])
+            self.flat = np.cumsum(counts) - counts, counts, np.array(members, dtype=np.int64)
+        return self.flat
+
+    def query_batch(self, points, radius=0.0):
+        # returns (point_idx, slots) arrays of every hit; cells, candidates and distances
+        # are all computed as arrays. self.keys[slot] maps a slot back to the inserted key
+        points = np.mod(np.asarray(points, dtype=np.float64).reshape(-1, 2), self.size)
+        if radius:
+            # every point covers up to `span` columns and rows, as in _covered_cells
+            col0 = np.floor((points[:, 0] - radius) / self.cell_size).astype(np.int64)
+            col1 = np.floor((points[:, 0] + radius) / self.cell_size).astype(np.int64)
+            row0 = np.floor((points[:, 1] - radius) / self.cell_size).astype(np.int64)
+            row1 = np.floor((points[:, 1] + radius) / self.cell_size).astype(np.int64)
+            n_cols = np.minimum(col1 - col0 + 1, self.n_cols)
+            n_rows = np.minimum(row1 - row0 + 1, self.n_rows)
+            span = min(int(2 * radius // self.cell_size) + 2, max(self.n_cols, self.n_rows))
+            offsets = np.arange(span)
+            valid = (offsets[None, :, None] < n_cols[:, None, None]) & (offsets[None, None, :] < n_rows[:, None, None])
+            cols = (col0[:, None, None] + offsets[None, :, None]) % self.n_cols
+            rows = (row0[:, None, None] + offsets[None, None, :]) % self.n_rows
+            cell_point, col_off, row_off = np.nonzero(valid)
+            cells = rows[cell_point, 0, row_off] * self.n_cols + cols[cell_point, col_off, 0]
+        else:
+            cols = (points[:, 0] // self.cell_size).astype(np.int64) % self.n_cols
+            rows = (points[:, 1] // self.cell_size).astype(np.int64) % self.n_rows
+            cell_point = np.arange(len(points))
+            cells = rows * self.n_cols + cols
+
+        starts, counts, members = self._flat_cells()
+        counts = counts[cells]
+        point_idx = np.repeat(cell_point, counts)
+        # position of every candidate inside its cell's run of members
+        within = np.arange(len(point_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+        slot_idx = members[np.repeat(starts[cells], counts) + within] if len(point_idx) else point_idx
+        if len(slot_idx) == 0:
+            return point_idx, slot_idx
+
+        delta = np.abs(points[point_idx] - self.pos[slot_idx])
+        delta = np.minimum(delta, np.asarray(self.size, dtype=np.float64) - delta)
+        dist = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        hit = dist <= self.radius[slot_idx] + radius
+        return point_idx[hit], slot_idx[hit]
+
+
+def update_index(index, items, coll_idx, remaining):
+    # mirror update_targets/update_pickups: drop collected items, add respawned ones
+    for idx in coll_idx:
+        index.remove(items[idx])
+    for item in remaining:
+        if item not in index:
+            index.insert(item, item.pos, item.size[0] / 2)
+    index.reindex(remaining)
@@ -0,0 +1,23 @@
+import os
+
+from copy import deepcopy
+
+from yaml import safe_load
+
+# parsed configs keyed by (absolute path, mtime), so every env of a process parses
+# the YAML once while an edited file is picked up
+_configs = {}
+
+
+def load_config(path):
+    path = os.path.abspath(path)
+    key = path, os.stat(path).st_mtime_ns
+    if key not in _configs:
+        with open(path, "r") as fin:
+            _configs[key] = safe_load(fin)
+    # callers own their copy and may modify it
+    return deepcopy(_configs[key])
+
+
+def clear():
+    _configs.clear()
@@ -0,0 +1,225 @@
+import glob
+import json
+import os
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import model_registry
+from evaluate import file_digest
+from observation import OBS_SIZE
+
+# (name, dtype, per-row shape) of every shard column
+COLUMNS = [
+    ("obs", np.float32, (OBS_SIZE,)),
+    ("action", np.uint8, ()),
+    ("reward", np.float32, ()),
+    ("next_obs", np.float32, (OBS_SIZE,)),
+    ("terminated", np.bool_, ()),
+    ("truncated", np.bool_, ()),
+]
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="roll out checkpoints into memmap shards")
+    generate.add_argument(
+        "--config",
+        type=str,
+        required=False,
+        default="configs/game_config.yml"
+    )
+    generate.add_argument("--weights", type=str, nargs="+", default=["weights/*.zip"], help="checkpoints or globs")
+    generate.add_argument("--out", type=str, default="data/transitions")
+    generate.add_argument("--transitions", type=int, default=1_000_000)
+    generate.add_argument("--shard-size", type=int, default=65536)
+    generate.add_argument("--seed", type=int, default=0, help="shard i is rolled out with seed + i")
+    generate.add_argument("--epsilon", type=float, default=None, help="exploration rate, the checkpoint's own by default")
+    generate.add_argument("--workers", type=int, default=os.cpu_count())
+
+    info = subparsers.add_parser("info", help="summarize a generated dataset")
+    info.add_argument("out", type=str)
+
+    return parser.parse_args()
+
+
+def shard_dir(out_dir, shard_idx):
+    return os.path.join(out_dir, f"shard_{shard_idx:05d}")
+
+
+def write_shard(config_file, checkpoint, out_dir, shard_idx, size, seed, epsilon=None):
+    # one shard of `size` consecutive transitions from a single seeded GameEnv
+    from gym_env import GameEnv
+
+    path = shard_dir(out_dir, shard_idx)
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(size, *shape))
+        for name, dtype, shape in COLUMNS
+    }
+
+    env = GameEnv(config_file)
+    net = model_registry.get_qnetwork(checkpoint)
+    rng = np.random.default_rng(seed)
+
+    obs, _ = env.reset(seed=seed)
+    episodes = 1
+    for idx in range(size):
+        action = net.predict(obs, rng, epsilon)[0]
+        next_obs, reward, terminated, truncated, _ = env.step(action)
+        arrays["obs"][idx] = obs
+        arrays["action"][idx] = action
+        arrays["reward"][idx] = reward
+        arrays["next_obs"][idx] = next_obs
+        arrays["terminated"][idx] = terminated
+        arrays["truncated"][idx] = truncated
+        if terminated or truncated:
+            next_obs, _ = env.reset()
+            episodes += 1
+        obs = next_obs
+
+    for array in arrays.values():
+        array.flush()
+    return {
+        "path": os.path.basename(path),
+        "size": size,
+        "checkpoint": os.path.basename(checkpoint),
+        "seed": seed,
+        "episodes": episodes,
+    }
+
+
+def generate(checkpoints, config_file, out_dir, transitions, shard_size=65536, seed=0, epsilon=None, workers=None):
+    # shards are assigned to checkpoints round-robin and rolled out on a process pool
+    if not checkpoints:
+        raise ValueError("no checkpoints to roll out")
+    os.makedirs(out_dir, exist_ok=True)
+    n_shards = -(-transitions // shard_size)
+    sizes = [min(shard_size, transitions - idx * shard_size) for idx in range(n_shards)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                write_shard, config_file, checkpoints[idx % len(checkpoints)], out_dir, idx, size, seed + idx, epsilon
+            )
+            for idx, size in enumerate(sizes)
+        ]
+        shards = [future.result() for future in futures]
+
+    index = {
+        "columns": [[name, np.dtype(dtype).str, list(shape)] for name, dtype, shape in COLUMNS],
+        "config": os.path.basename(config_file),
+        "config_sha256": file_digest(config_file),
+        "epsilon": epsilon,
+        "total": int(sum(sizes)),
+        "shards": shards,
+    }
+    with open(os.path.join(out_dir, "index.json"), "w") as fout:
+        json.dump(index, fout, indent=2)
+    return index
+
+
+class ShardedDataset:
+    # read-only view over a generated dataset; shards stay memory-mapped and only
+    # the rows of the current minibatch are copied out
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        with open(os.path.join(out_dir, "index.json"), "r") as fin:
+            self.index = json.load(fin)
+        self.shards = [
+            {
+                name: np.load(os.path.join(out_dir, shard["path"], f"{name}.npy"), mmap_mode="r")
+                for name, _, _ in self.index["columns"]
+            }
+            for shard in self.index["shards"]
+        ]
+
+    def __len__(self):
+        return self.index["total"]
+
+    def iter_minibatches(self, batch_size=256, shards_per_window=4, seed=None, drop_last=False):
+        # one epoch of shuffled minibatches: shards are visited in random order, a window of
+        # `shards_per_window` at a time, and rows are shuffled across the whole window, so
+        # memory stays bounded by the window's index arrays plus one batch
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self.shards))
+        for start in range(0, len(order), shards_per_window):
+            window = order[start:start + shards_per_window]
+            shard_idx = np.concatenate([np.full(len(self.shards[idx]["action"]), idx) for idx in window])
+            row_idx = np.concatenate([np.arange(len(self.shards[idx]["action"])) for idx in window])
+            perm = rng.permutation(len(row_idx))
+            for batch_start in range(0, len(perm), batch_size):
+                batch = perm[batch_start:batch_start + batch_size]
+                if drop_last and len(batch) < batch_size:
+                    break
+                yield self._gather(shard_idx[batch], row_idx[batch])
+
+    def _gather(self, shard_idx, row_idx):
+        batch = {}
+        for name, dtype, shape in self.index["columns"]:
+            out = np.empty((len(row_idx), *shape), dtype=dtype)
+            for idx in np.unique(shard_idx):
+                mask = shard_idx == idx
+                rows = row_idx[mask]
+                # sorted reads are kinder to the page cache; scatter back into batch order
+                order = np.argsort(rows)
+                out[np.flatnonzero(mask)[order]] = self.shards[idx][name][rows[order]]
+            batch[name] = out
+        return batch
+
+    def fill_replay_buffer(self, buffer, limit=None, batch_size=4096, seed=None):
+        # warm-starts an SB3 ReplayBuffer; running out of fuel is flagged like VecGameEnv's
+        # TimeLimit.truncated so SB3 bootstraps through it
+        added = 0
+        limit = len(self) if limit is None else min(limit, len(self))
+        for batch in self.iter_minibatches(batch_size, seed=seed):
+            batch = {name: values[:limit - added] for name, values in batch.items()}
+            dones = batch["terminated"] | batch["truncated"]
+            for idx in range(len(dones)):
+                buffer.add(
+                    batch["obs"][idx],
+                    batch["next_obs"][idx],
+                    batch["action"][idx:idx + 1].astype(np.int64),
+                    batch["reward"][idx:idx + 1],
+                    dones[idx:idx + 1],
+                    [{"TimeLimit.truncated": bool(batch["truncated"][idx])}]
+                )
+            added += len(dones)
+            if added >= limit:
+                break
+        return added
+
+
+def main():
+
+    args = parse_args()
+    if args.command == "generate":
+        checkpoints = sorted({path for pattern in args.weights for path in glob.glob(pattern)})
+        if not checkpoints:
+            raise SystemExit(f"no checkpoints match --weights {' '.join(args.weights)}")
+        index = generate(
+            checkpoints,
+            args.config,
+            args.out,
+            args.transitions,
+            shard_size=args.shard_size,
+            seed=args.seed,
+            epsilon=args.epsilon,
+            workers=args.workers
+        )
+        print(f"{index['total']} transitions in {len(index['shards'])} shards -> {args.out}")
+    else:
+        dataset = ShardedDataset(args.out)
+        episodes = sum(shard["episodes"] for shard in dataset.index["shards"])
+        checkpoints = sorted({shard["checkpoint"] for shard in dataset.index["shards"]})
+        print(f"{len(dataset)} transitions, {len(dataset.shards)} shards, ~{episodes} episodes")
+        print(f"checkpoints: {', '.join(checkpoints)}")
+
+
+if __name__ == "__main__":
+    main()
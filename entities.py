@@ -0,0 +1,131 @@
+import numpy as np
+
+from collision import update_index
+
+
+class EntityStore:
+    # every target/pickup lives in one row of these arrays; Target, ReplenishFuel and
+    # BetterPlane objects are only (store, slot) views. Freed rows are reused by the
+    # next spawn, and the arrays double when full
+
+    def __init__(self, capacity=16):
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.size = np.zeros((capacity, 2), dtype=np.int32)
+        self.radius = np.zeros(capacity, dtype=np.float64)
+        self.active = np.zeros(capacity, dtype=bool)
+        # stack of free slots, lowest on top
+        self.free = np.arange(capacity - 1, -1, -1, dtype=np.int64)
+        self.n_free = capacity
+
+    def __len__(self):
+        return int(np.count_nonzero(self.active))
+
+    @property
+    def capacity(self):
+        return len(self.active)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.kind, self.pos, self.size, self.radius, self.active, self.free))
+
+    def _grow(self):
+        capacity = self.capacity
+        self.kind = np.concatenate([self.kind, np.zeros_like(self.kind)])
+        self.pos = np.concatenate([self.pos, np.zeros_like(self.pos)])
+        self.size = np.concatenate([self.size, np.zeros_like(self.size)])
+        self.radius = np.concatenate([self.radius, np.zeros_like(self.radius)])
+        self.active = np.concatenate([self.active, np.zeros_like(self.active)])
+        free = np.empty(2 * capacity, dtype=np.int64)
+        free[:capacity] = np.arange(2 * capacity - 1, capacity - 1, -1)
+        free[capacity:capacity + self.n_free] = self.free[:self.n_free]
+        self.free = free
+        self.n_free += capacity
+
+    def allocate(self, kind, pos, size):
+        if self.n_free == 0:
+            self._grow()
+        self.n_free -= 1
+        slot = int(self.free[self.n_free])
+        self.kind[slot] = kind
+        self.pos[slot] = pos
+        self.size[slot] = size
+        self.radius[slot] = size[0] / 2
+        self.active[slot] = True
+        return slot
+
+    def release(self, slot):
+        if self.active[slot]:
+            self.active[slot] = False
+            self.free[self.n_free] = slot
+            self.n_free += 1
+
+    def active_slots(self, kind=None):
+        mask = self.active if kind is None else self.active & (self.kind == kind)
+        return np.flatnonzero(mask)
+
+
+# entities created without an explicit store
+default_store = EntityStore()
+
+
+class Entity:
+    # thin view of one EntityStore row; subclasses set `kind`
+
+    __slots__ = ("store", "slot")
+    kind = -1
+
+    def __init__(self, pos, size, store=None):
+        # the row is held until despawn(); owners release it explicitly
+        self.store = default_store if store is None else store
+        self.slot = self.store.allocate(self.kind, pos, size)
+
+    @property
+    def pos(self):
+        return self.store.pos[self.slot]
+
+    @pos.setter
+    def pos(self, value):
+        self.store.pos[self.slot] = value
+
+    @property
+    def size(self):
+        width, height = self.store.size[self.slot]
+        return int(width), int(height)
+
+    @property
+    def radius(self):
+        return float(self.store.radius[self.slot])
+
+    @property
+    def active(self):
+        return self.slot >= 0 and bool(self.store.active[self.slot])
+
+    def respawn(self, pos):
+        # reuse this entity at a new position instead of allocating a replacement
+        self.store.pos[self.slot] = pos
+
+    def despawn(self):
+        if self.slot >= 0:
+            self.store.release(self.slot)
+            self.slot = -1
+
+
+def collect(items, coll_idx, spawns, index=None):
+    # drops the collected items; when none would remain, the first collected one is moved
+    # to the next position of `spawns` (a SpawnQueue) instead, so a respawn allocates nothing
+    if not coll_idx:
+        return items
+    collected = set(coll_idx)
+    remaining = [item for idx, item in enumerate(items) if idx not in collected]
+    reused = None
+    if not remaining:
+        reused = items[coll_idx[0]]
+        reused.respawn(spawns.next())
+        remaining = [reused]
+    if index is not None:
+        update_index(index, items, coll_idx, remaining)
+    for idx in collected:
+        if items[idx] is not reused:
+            items[idx].despawn()
+    return remaining
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+
+# what ShmSubprocVecEnv children need, kept free of stable_baselines3 imports so a
+# worker only loads the env (torch stays in the training process)
+
+
+def make_env(config_file):
+    from gym_env import GameEnv
+
+    return GameEnv(config_file, False)
+
+
+class CloudpickleWrapper:
+    # env factories may be lambdas or closures, which plain pickle rejects
+
+    def __init__(self, var):
+        self.var = var
+
+    def __getstate__(self):
+        import cloudpickle
+
+        return cloudpickle.dumps(self.var)
+
+    def __setstate__(self, var):
+        import pickle
+
+        self.var = pickle.loads(var)
+
+
+def shm_worker(remote, parent_remote, env_fn_wrapper, idx, shm, obs_shape):
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+
+    obs_buf = np.frombuffer(shm["obs"], dtype=np.float32).reshape(obs_shape)
+    terminal_buf = np.frombuffer(shm["terminal_obs"], dtype=np.float32).reshape(obs_shape)
+    rew_buf = np.frombuffer(shm["rews"], dtype=np.float32)
+    done_buf = np.frombuffer(shm["dones"], dtype=np.uint8)
+    action_buf = np.frombuffer(shm["actions"], dtype=np.int64)
+    steps_buf = np.frombuffer(shm["steps"], dtype=np.int64)
+    busy_buf = np.frombuffer(shm["busy"], dtype=np.float64)
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                start = time.perf_counter()
+                obs, reward, done, truncated, info = env.step(action_buf[idx])
+                info["TimeLimit.truncated"] = truncated and not done
+                if done or truncated:
+                    terminal_buf[idx] = obs
+                    obs, _ = env.reset()
+                obs_buf[idx] = obs
+                rew_buf[idx] = reward
+                done_buf[idx] = done or truncated
+                busy_buf[idx] += time.perf_counter() - start
+                steps_buf[idx] += 1
+                remote.send(info)
+            elif cmd == "reset":
+                obs, reset_info = env.reset(seed=data)
+                obs_buf[idx] = obs
+                remote.send(reset_info)
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "is_wrapped":
+                remote.send(False)
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        print("ShmSubprocVecEnv worker: got KeyboardInterrupt")
+    finally:
+        env.close()
@@ -0,0 +1,180 @@
+import ast
+import glob
+import hashlib
+import json
+import os
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import model_registry
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=False,
+        default="configs/game_config.yml"
+    )
+    parser.add_argument("--weights", type=str, nargs="+", default=["weights/*.zip"], help="checkpoints or globs")
+    parser.add_argument("--episodes", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0, help="episode i is played with seed + i")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--stochastic", action="store_true", help="act epsilon-greedily like DQN.predict")
+    parser.add_argument("--cache", type=str, default="logs/leaderboard.json")
+    parser.add_argument("--force", action="store_true", help="ignore cached results")
+
+    return parser.parse_args()
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_digest(module="evaluate"):
+    # hash of the source of `module` and of every module of this repo it imports, lazy
+    # imports included, found by walking the import statements. Any change to the env,
+    # physics or policy code lands in the cache key without a version to bump by hand
+    root = os.path.dirname(os.path.abspath(__file__))
+    seen = set()
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        path = os.path.join(root, f"{name}.py")
+        if name in seen or not os.path.isfile(path):
+            continue
+        seen.add(name)
+        with open(path, "r") as fin:
+            tree = ast.parse(fin.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                pending.append(node.module.split(".")[0])
+
+    digest = hashlib.sha256()
+    for name in sorted(seen):
+        digest.update(f"{name}:{file_digest(os.path.join(root, f'{name}.py'))}\n".encode())
+    return digest.hexdigest()
+
+
+def cache_key(source_hash, checkpoint_hash, config_hash, episodes, seed, stochastic):
+    # anything that changes the numbers has to be part of the key
+    return f"{source_hash}:{checkpoint_hash}:{config_hash}:{episodes}:{seed}:{int(stochastic)}"
+
+
+def play_episode(config_file, checkpoint, seed, stochastic):
+    from gym_env import GameEnv
+
+    env = GameEnv(config_file)
+    net = model_registry.get_qnetwork(checkpoint)
+    rng = np.random.default_rng(seed) if stochastic else None
+
+    obs, _ = env.reset(seed=seed)
+    episode_return = 0.0
+    length = 0
+    while True:
+        action = net.predict(obs, rng)[0]
+        obs, reward, done, truncated, _ = env.step(action)
+        episode_return += reward
+        length += 1
+        if done or truncated:
+            break
+    return {
+        "return": episode_return,
+        "score": env.player.score,
+        "fuel_out": bool(truncated),
+        "length": length,
+    }
+
+
+def summarize(episodes):
+    returns = np.array([ep["return"] for ep in episodes])
+    scores = np.array([ep["score"] for ep in episodes])
+    lengths = np.array([ep["length"] for ep in episodes])
+    return {
+        "episodes": len(episodes),
+        "return_mean": float(returns.mean()),
+        "return_std": float(returns.std()),
+        "score_mean": float(scores.mean()),
+        "score_std": float(scores.std()),
+        "fuel_outs": int(sum(ep["fuel_out"] for ep in episodes)),
+        "length_mean": float(lengths.mean()),
+    }
+
+
+def evaluate(checkpoints, config_file, episodes=20, seed=0, workers=None, stochastic=False, cache_path=None, force=False):
+    cache = {}
+    if cache_path is not None and os.path.isfile(cache_path) and not force:
+        with open(cache_path, "r") as fin:
+            cache = json.load(fin)
+
+    source_hash = source_digest()
+    config_hash = file_digest(config_file)
+    keys = {
+        path: cache_key(source_hash, file_digest(path), config_hash, episodes, seed, stochastic)
+        for path in checkpoints
+    }
+    pending = [path for path in checkpoints if keys[path] not in cache]
+
+    if pending:
+        # one task per episode so long and short checkpoints balance across the pool
+        tasks = [(path, seed + idx) for path in pending for idx in range(episodes)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(play_episode, config_file, path, ep_seed, stochastic) for path, ep_seed in tasks]
+            played = {}
+            for (path, _), future in zip(tasks, futures):
+                played.setdefault(path, []).append(future.result())
+
+        for path in pending:
+            cache[keys[path]] = {"checkpoint": path, **summarize(played[path])}
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(cache_path, "w") as fout:
+                json.dump(cache, fout, indent=2)
+
+    results = [{**cache[keys[path]], "checkpoint": path} for path in checkpoints]
+    return sorted(results, key=lambda result: result["return_mean"], reverse=True), len(pending)
+
+
+def print_leaderboard(results):
+    print(f"{'#':>2} {'checkpoint':45s} {'return':>16s} {'score':>14s} {'fuel-outs':>9s} {'length':>8s}")
+    for rank, result in enumerate(results, 1):
+        print(
+            f"{rank:2d} {os.path.basename(result['checkpoint']):45s} "
+            f"{result['return_mean']:8.1f} ± {result['return_std']:5.1f} "
+            f"{result['score_mean']:6.1f} ± {result['score_std']:5.1f} "
+            f"{result['fuel_outs']:5d}/{result['episodes']:<3d} "
+            f"{result['length_mean']:8.0f}"
+        )
+
+
+def main():
+
+    args = parse_args()
+    checkpoints = sorted({path for pattern in args.weights for path in glob.glob(pattern)})
+    results, evaluated = evaluate(
+        checkpoints,
+        args.config,
+        episodes=args.episodes,
+        seed=args.seed,
+        workers=args.workers,
+        stochastic=args.stochastic,
+        cache_path=args.cache,
+        force=args.force
+    )
+    print(f"evaluated {evaluated} checkpoint(s), {len(checkpoints) - evaluated} from cache")
+    print_leaderboard(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,26 @@
-import cv2
+import json
+import os
+
 import pygame
-import matplotlib as mpl
 import numpy as np
 
 from argparse import ArgumentParser
-from yaml import safe_load
 from math import pi
 from copy import deepcopy
 
+from collision import CollisionGrid
+from config import load_config
+from entities import EntityStore, collect
+from observation import OBS_SIZE, get_obs
 from target import Target
-from player import HumanPlayer, RandomPlayer, DQNPlayer
+from timer import CountdownTimer
+from player import Player, HumanPlayer, RandomPlayer, ScriptedPlayer, DQNPlayer, RemoteDQNPlayer
+from profiler import NULL_PROFILER, Profiler
+from recorder import EpisodeBuffer, TrajectoryWriter, snapshot
+from renderer import DirtyRenderer
 from pickup import ReplenishFuel, BetterPlane
+from spawn import SpawnQueue
+from sprites import InvertChannels
 from status import StatusBar
 
 def parse_args():
@@ -22,6 +32,34 @@ def parse_args():
         required=False,
         default="configs/game_config.yml"
     )
+    parser.add_argument("--seed", type=int, default=None, help="seed for respawn positions")
+    parser.add_argument("--record", type=str, default=None, help="record every frame to this trajectory file")
+    parser.add_argument("--profile", type=str, default=None, help="write per-phase frame timings to this JSON file")
+    parser.add_argument("--overlay", action="store_true", help="show per-phase timings on screen")
+    parser.add_argument(
+        "--policy-server",
+        type=str,
+        default=None,
+        help="socket of a running policy_server.py; the AI then acts on replies to the previous frame"
+    )
+    parser.add_argument(
+        "--render-fps",
+        type=int,
+        default=None,
+        help="frame rate cap of the window (0 for none); the simulation always ticks at the config fps"
+    )
+    parser.add_argument(
+        "--opponent",
+        type=str,
+        default=None,
+        choices=["human", "ai", "random", "idle", "script"],
+        help="who flies the second plane (default: human, or ai with --headless)"
+    )
+    parser.add_argument("--script", type=str, default=None, help="file of actions (0-4) the script opponent plays, one per tick")
+    parser.add_argument("--headless", action="store_true", help="no window: simulate matches as fast as possible")
+    parser.add_argument("--matches", type=int, default=1, help="number of matches to simulate with --headless")
+    parser.add_argument("--parallel", type=int, default=64, help="headless matches stepped together, sharing AI forward passes")
+    parser.add_argument("--results", type=str, default=None, help="write per-match headless results to this JSON file")
 
     return parser.parse_args()
 
@@ -34,132 +72,324 @@ def init_game(width, height):
     clock = pygame.time.Clock()
     return font, font_large, screen, clock
 
-def update_targets(targets, coll_idx):
-    remaining_targets = [elem for idx, elem in enumerate(targets) if idx not in coll_idx]
-    if not remaining_targets:
-        remaining_targets = [Target(np.random.randint(100, 700, size=(2,)), (80,80),  render=True)]
-    return remaining_targets
+def update_targets(targets, coll_idx, spawns, index=None):
+    return collect(targets, coll_idx, spawns, index)
+
+
+def update_pickups(pickups, coll_idx, spawns, index=None):
+    return collect(pickups, coll_idx, spawns, index)
+
+# what the second seat is called on screen and in results, by --opponent
+SEAT_LABELS = {"human": "Human", "ai": "AI 2", "random": "Random", "idle": "Idle", "script": "Script"}
 
 
-def update_pickups(pickups, coll_idx):
-    remaining_pickups = [elem for idx, elem in enumerate(pickups) if idx not in coll_idx]
-    if not remaining_pickups:
-        remaining_pickups = [ReplenishFuel(np.random.randint(100, 700, size=(2,)), (80,80), render=True)]
-    return remaining_pickups
+def seat_labels(opponent):
+    return ["AI", SEAT_LABELS[opponent]]
 
-def game_over_info(done, players, bar, bar2):
+
+def winner_seat(players):
+    # index of the seat with the higher score, None on a tie
+    if players[0].score == players[1].score:
+        return None
+    return int(players[1].score > players[0].score)
+
+
+def game_over_info(done, players, bar, bar2, labels=("AI", "Human")):
     if done == 1:
         msg1 = "Game over!"
     else:
         if bar.value <= 0 and bar2.value > 0:
-            msg1 = "AI ran out of fuel!"
+            msg1 = f"{labels[0]} ran out of fuel!"
         if bar.value > 0 and bar2.value <= 0:
-            msg1 = "Human ran out of fuel!"
+            msg1 = f"{labels[1]} ran out of fuel!"
         if bar.value <= 0 and bar2.value <= 0:
             msg1 = "Both players ran out of fuel!"
                 
-    if players[1].score > players[0].score:
-        msg = "Human won."
-    elif players[0].score > players[1].score:
-        msg = "AI won."
-    else:
+    winner = winner_seat(players)
+    if winner is None:
         msg = "It's a tie."
+    else:
+        msg = f"{labels[winner]} won."
     return msg1, msg
 
-def get_game_elements(config):
-    targets = [Target(pos=np.array([100, 100]), size=(80, 80), render=True)]
-    pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80), render=True)]
-
-    players = [
-        DQNPlayer(
-            **deepcopy(config["player"]),
-            model_path=[
-                "weights/rl_model_v1_10000000_steps.zip",
-                "weights/rl_model_v6_10000000_steps.zip"
-            ],
-            render=True
-        ),
-        HumanPlayer(**deepcopy(config["player"]), render=True)
+def get_game_elements(config, policy_server=None, opponent="human", render=True, script=(), store=None, blocking=False):
+    targets = [Target(pos=np.array([100, 100]), size=(80, 80), render=render, store=store)]
+    pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80), render=render, store=store)]
+
+    model_path = [
+        "weights/rl_model_v1_10000000_steps.zip",
+        "weights/rl_model_v6_10000000_steps.zip"
     ]
+    if policy_server is not None:
+        ai_player = RemoteDQNPlayer(
+            **deepcopy(config["player"]), model_path=model_path, render=render, socket_path=policy_server, blocking=blocking
+        )
+    else:
+        ai_player = DQNPlayer(**deepcopy(config["player"]), model_path=model_path, render=render)
+
+    if opponent == "human":
+        second = HumanPlayer(**deepcopy(config["player"]), render=render)
+    elif opponent == "ai":
+        # the same models in the other seat, in the plane's original colors
+        second = type(ai_player)(
+            **deepcopy(config["player"]), model_path=model_path, render=render, recolor=InvertChannels(()),
+            **({} if policy_server is None else {"socket_path": policy_server, "blocking": blocking})
+        )
+    elif opponent == "random":
+        second = RandomPlayer(**deepcopy(config["player"]), render=render)
+    elif opponent == "script":
+        second = ScriptedPlayer(**deepcopy(config["player"]), actions=script, render=render)
+    else:
+        second = Player(**deepcopy(config["player"]), render=render)
+    players = [ai_player, second]
     bar = StatusBar()
     bar2 = StatusBar(topleft=(500, 70), color=(214, 15, 58))
     t = 0
     return targets, pickups, players, bar, bar2, t
 
-def get_obs_for_agent(targets, pickups, bar, player):
-    angle_to_ox = player.angle / 180 * np.pi
-    speed = player.speed
-    distance_to_target = np.linalg.norm(player.pos-targets[0].pos)/500
-    angle_to_target = np.arctan2(
-        targets[0].pos[1]-player.pos[1],
-        targets[0].pos[0]-player.pos[0]
-    )
-                
-    distance_to_pickup = np.linalg.norm(player.pos-pickups[0].pos)/500
-    angle_to_pickup = np.arctan2(
-        pickups[0].pos[1]-player.pos[1],
-        pickups[0].pos[0]-player.pos[0]
-    )
-
-    obs = np.array(
-        [
-            angle_to_ox,
-            speed,
-            distance_to_target,
-            angle_to_target,
-            distance_to_pickup,
-            angle_to_pickup,
-            player.angle - angle_to_target,
-            player.angle - angle_to_pickup,
-            bar.value
+def get_obs_for_agent(targets, pickups, bar, player, out=None):
+    return get_obs(player, targets[0], pickups[0], bar, out=out)
+
+
+class Match:
+    # one match, advanced in fixed ticks of 1/fps simulated seconds whether it is drawn
+    # in a window or not; the countdown comes from the tick count, never from wall time
+
+    def __init__(
+        self, config, spawns, policy_server=None, opponent="human", render=True, script=(),
+        recorder=None, episode=0, profiler=NULL_PROFILER, blocking=False
+    ):
+        self.screen_size = config["view"]["width"], config["view"]["height"]
+        self.fps = config["game"]["fps"]
+        self.time_limit = config["game"]["time_limit"]
+        self.spawns = spawns
+        # stars and pickups of this match live in its own store, dropped with the match
+        self.entities = EntityStore()
+        self.targets, self.pickups, self.players, bar, bar2, _ = get_game_elements(
+            config, policy_server, opponent, render, script, self.entities, blocking
+        )
+        # seat i scores into players[i] and burns and refuels bars[i]
+        self.bars = [bar, bar2]
+        self.labels = seat_labels(opponent)
+        self.target_index = CollisionGrid.from_items(self.targets, self.screen_size, store=self.entities)
+        self.pickup_index = CollisionGrid.from_items(self.pickups, self.screen_size, store=self.entities)
+        self.ai_seats = [idx for idx, player in enumerate(self.players) if isinstance(player, DQNPlayer)]
+        self.recorder = recorder
+        self.episode = episode
+        self.profiler = profiler
+        self.prev_pos = np.array([player.pos for player in self.players], dtype=np.float64)
+        self.ticks = 0
+        self.done = 0
+
+    @property
+    def t(self):
+        # simulated milliseconds since the start
+        return 1000 * self.ticks / self.fps
+
+    def tick(self):
+        # AI seats must have acted already, see act_ai
+        for idx, player in enumerate(self.players):
+            self.prev_pos[idx] = player.pos
+        for idx, player in enumerate(self.players):
+            if idx not in self.ai_seats:
+                player.act(obs=None)
+                self.profiler.lap("act")
+            player.update(self.screen_size)
+            self.profiler.lap("update")
+
+            coll_idx = player.check_points(self.targets, self.target_index)
+            self.targets = update_targets(self.targets, coll_idx, self.spawns, self.target_index)
+            coll_idx = player.check_pickups(self.pickups, self.bars[idx], self.pickup_index)
+            self.pickups = update_pickups(self.pickups, coll_idx, self.spawns, self.pickup_index)
+            self.profiler.lap("collisions")
+
+        for player, bar in zip(self.players, self.bars):
+            bar.update(player.get_fuel_delta())
+        if any(bar.value <= 0.0 for bar in self.bars):
+            self.done = 2
+        self.profiler.lap("fuel")
+
+        self.ticks += 1
+        if self.ticks / self.fps >= self.time_limit and self.done == 0:
+            self.done = 1
+
+        if self.recorder is not None:
+            # the row of the tick just played, with how it ended the match if it did
+            self.recorder.append(
+                episode=self.episode,
+                step=self.ticks - 1,
+                time=(self.ticks - 1) / self.fps,
+                done=self.done == 1,
+                truncated=self.done == 2,
+                **snapshot(self.players, self.bars, self.targets, self.pickups),
+                action=[player.last_action for player in self.players]
+            )
+            self.profiler.lap("record")
+
+    def positions(self, alpha):
+        # plane positions a fraction alpha of the way from the previous tick to the
+        # current one; a plane that wrapped around an edge is drawn where it is now
+        pos = np.array([player.pos for player in self.players], dtype=np.float64)
+        delta = pos - self.prev_pos
+        wrapped = (np.abs(delta) > np.array(self.screen_size) / 2).any(axis=1)
+        return np.where(wrapped[:, None], pos, self.prev_pos + alpha * delta)
+
+    def result(self):
+        msg1, msg = game_over_info(self.done, self.players, *self.bars, self.labels)
+        return {
+            "episode": self.episode,
+            "ticks": self.ticks,
+            "seats": self.labels,
+            "score": [player.score for player in self.players],
+            "fuel": [bar.value for bar in self.bars],
+            "ending": msg1,
+            "winner": msg,
+            "winner_seat": winner_seat(self.players),
+        }
+
+
+def act_ai(matches, obs_buf):
+    # one batched forward pass for the AI seats of every unfinished match
+    seats = [(match, idx) for match in matches if match.done == 0 for idx in match.ai_seats]
+    if not seats:
+        return
+    if len(obs_buf) < len(seats):
+        obs_buf = np.empty((len(seats), OBS_SIZE), dtype=np.float32)
+    for row, (match, idx) in enumerate(seats):
+        get_obs_for_agent(match.targets, match.pickups, match.bars[idx], match.players[idx], out=obs_buf[row])
+    DQNPlayer.act_batch([match.players[idx] for match, idx in seats], obs_buf[:len(seats)])
+
+def draw_frame(
+    renderer, font, timer, targets, pickups, players, bar, bar2, t, profiler=NULL_PROFILER, positions=None,
+    labels=("AI", "Human")
+):
+    # queues the frame's layers, back to front; renderer.render() draws what changed.
+    # positions, when given, are where the planes are drawn (see Match.positions)
+    for idx, player in enumerate(players):
+        renderer.blit(("player", idx), *player.sprite(None if positions is None else positions[idx]))
+    for idx, target in enumerate(targets):
+        renderer.blit(("target", idx), *target.sprite())
+    renderer.blit("bar", *bar.sprite())
+    renderer.blit("bar2", *bar2.sprite())
+    for idx, pickup in enumerate(pickups):
+        renderer.blit(("pickup", idx), *pickup.sprite())
+    profiler.lap("sprites")
+
+    # rendered again only when a score changes
+    renderer.text("score_ai", font, f"Score ({labels[0]}): {players[0].score}", bar.color, topleft=(10, 20))
+    renderer.text("score_human", font, f"Score ({labels[1]}): {players[1].score}", bar2.color, topleft=(10, 50))
+    profiler.lap("text")
+
+    arc, label, label_box = timer.sprites(t)
+    renderer.add("timer", timer.rect.union(label_box), (arc, label), timer.draw, renderer.screen, t)
+    profiler.lap("timer")
+
+def load_script(path):
+    if path is None:
+        return ()
+    with open(path) as f:
+        return [int(action) for action in f.read().split()]
+
+def run_headless(args, config):
+    # matches in lockstep batches of args.parallel, so the AI seats of all of them share
+    # forward passes; no window, no clock, nothing drawn. With a policy server every
+    # tick waits for its reply, as there is no frame budget to protect (exploration
+    # still draws from the server's generator, so --seed does not pin those matches)
+    opponent = args.opponent or "ai"
+    if opponent == "human":
+        raise SystemExit("--headless has no keyboard: pick an ai, random, idle or script opponent")
+    script = load_script(args.script)
+    if args.seed is not None:
+        # RandomPlayer draws from the global generator
+        np.random.seed(args.seed)
+    # match i respawns from stream i; the first equals the windowed game with the same seed
+    children = np.random.SeedSequence(args.seed).spawn(args.matches)
+    recorder = None
+    if args.record is not None:
+        recorder = TrajectoryWriter(args.record, n_players=2, meta={"source": "game", "seed": args.seed, "headless": True})
+
+    results = []
+    obs_buf = np.empty((2 * args.parallel, OBS_SIZE), dtype=np.float32)
+    for start in range(0, args.matches, args.parallel):
+        matches = [
+            Match(
+                config, SpawnQueue([np.random.default_rng(child)]), args.policy_server, opponent, render=False,
+                script=script, recorder=None if recorder is None else EpisodeBuffer(n_players=2),
+                episode=start + idx, blocking=True
+            )
+            for idx, child in enumerate(children[start:start + args.parallel])
         ]
-    ).astype(np.float32)
-    
-    return obs
-
-def draw_arc(surf, color, center, radius, width, end_angle):
-    circle_image = np.zeros((radius*2+4, radius*2+4, 4), dtype = np.uint8)
-    circle_image = cv2.ellipse(circle_image, (radius+2, radius+2),
-        (radius-width//2, radius-width//2), 0, 0, end_angle, (*color, 255), width, lineType=cv2.LINE_AA) 
-    
-    circle_surface = pygame.image.frombuffer(circle_image.flatten(), (radius*2+4, radius*2+4), 'RGBA')
-    surf.blit(circle_surface, circle_surface.get_rect(center = center), special_flags=pygame.BLEND_PREMULTIPLIED)
-
-def draw_timer(time_limit, font, screen, cmap, t):
-
-    countdown = time_limit - (t / 1000)
-    curr_color = tuple([int(255*elem) for elem in cmap(int(100*countdown/time_limit))[:3]])
-    draw_arc(screen, curr_color, (70, 700), 50, 5, 360 * countdown/time_limit)
-    
-    total_time = round(countdown)
-    minutes = total_time // 60
-    seconds = total_time % 60
-    text = font.render(f"{minutes:02}:{seconds:02}", True, (0, 0, 0))
-    text_box = text.get_rect()
-    text_box.center = (70, 700)
-    screen.blit(text, text_box)
-
+        if start == 0 and args.seed is not None:
+            # the engines are shared by every match; local ones explore with their own generator
+            for engine in {id(player.engine): player.engine for player in matches[0].players if hasattr(player, "engine")}.values():
+                if hasattr(engine, "rng"):
+                    engine.rng = np.random.default_rng(args.seed)
+        live = matches
+        while live:
+            act_ai(live, obs_buf)
+            for match in live:
+                match.tick()
+                if match.done != 0 and recorder is not None:
+                    # the whole match at once, never interleaved with the others
+                    match.recorder.write_to(recorder)
+            live = [match for match in live if match.done == 0]
+        for match in matches:
+            result = match.result()
+            results.append(result)
+            print(f"match {result['episode']}: {result['score'][0]}-{result['score'][1]} {result['ending']} {result['winner']}")
+
+    if recorder is not None:
+        recorder.close()
+    wins = [sum(result["winner_seat"] == seat for result in results) for seat in (0, 1, None)]
+    labels = seat_labels(opponent)
+    print(f"{len(results)} matches: {labels[0]} {wins[0]}, {labels[1]} {wins[1]}, ties {wins[2]}")
+    if args.results is not None:
+        os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+        with open(args.results, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
 
 def main():
 
     args = parse_args()
-    with open(args.config, "r") as fin:
-        config = safe_load(fin)
-    
+    config = load_config(args.config)
+    if args.headless:
+        run_headless(args, config)
+        return
+
     screen_size = config["view"]["width"], config["view"]["height"]
     width, height = screen_size
     fps = config["game"]["fps"]
     time_limit = config["game"]["time_limit"]
-    
+    render_fps = fps if args.render_fps is None else args.render_fps
+    opponent = args.opponent or "human"
+    script = load_script(args.script)
+    # one simulation tick, and the most simulated time a single frame may catch up on
+    tick_ms = 1000 / fps
+    max_frame_ms = 250
+
     font, font_large, screen, clock = init_game(width, height)
+    renderer = DirtyRenderer(screen)
 
     quit = False
-    done = 0
-    cmap = mpl.colormaps["gist_rainbow"]
-    targets, pickups, players, bar, bar2, t = get_game_elements(config)
+    timer = CountdownTimer(time_limit, font)
+    spawns = SpawnQueue.from_seed(args.seed)
+    obs_buf = np.empty((2, OBS_SIZE), dtype=np.float32)
+    recorder = None
+    if args.record is not None:
+        recorder = TrajectoryWriter(args.record, n_players=2, meta={"source": "game", "seed": args.seed})
+    episode = 0
+    profiler = NULL_PROFILER
+    if args.profile is not None or args.overlay:
+        profiler = Profiler(budget_ms=1000 / render_fps if render_fps else None)
+    match = Match(config, spawns, args.policy_server, opponent, script=script, recorder=recorder, profiler=profiler)
+    accumulator = 0.0
+    dt = 0
+    # loading the models above is not game time
+    clock.tick()
 
     while not quit:
-        screen.fill((118, 170, 176))
+        profiler.start_frame()
 
         for event in pygame.event.get():
             if (
@@ -169,75 +399,60 @@ def main():
             ):
                 quit = True
 
-            if done > 0:
+            if match.done > 0:
                 if (event.type == pygame.KEYDOWN and event.key == pygame.K_y):
-                    done = 0
                     clock = pygame.time.Clock()
-                    targets, pickups, players, bar, bar2, t = get_game_elements(config)
+                    episode += 1
+                    match = Match(
+                        config, spawns, args.policy_server, opponent, script=script, recorder=recorder,
+                        episode=episode, profiler=profiler
+                    )
+                    accumulator = 0.0
+                    dt = 0
                 elif (event.type == pygame.KEYDOWN and event.key == pygame.K_n):
                     quit=True
-        
-        if done == 0:
-            for player in players:
-                obs=None
-                if isinstance(player, DQNPlayer):
-                    obs = get_obs_for_agent(targets, pickups, bar, player)
-
-                player.act(obs=obs)
-                player.update(screen_size)
-                
-                coll_idx = player.check_points(targets)
-                targets = update_targets(targets, coll_idx)
-                if isinstance(player, DQNPlayer):
-                    coll_idx = player.check_pickups(pickups, bar)
-                else:
-                    coll_idx = player.check_pickups(pickups, bar2)
-                pickups = update_pickups(pickups, coll_idx)
-
-            bar.update(players[0].get_fuel_delta())
-            bar2.update(players[1].get_fuel_delta())
-
-            if bar.value <= 0.0 or bar2.value <= 0.0:
-                done = 2
-            
-            for player in players:
-                player.draw(screen)
-            for target in targets:
-                target.draw(screen)
-            bar.draw(screen)
-            bar2.draw(screen)
-            for pickup in pickups:
-                pickup.draw(screen)
-
-            text = font.render(f"Score (AI): {players[0].score}", True, bar.color)
-            text_box = text.get_rect()
-            text_box.topleft = (10,20)
-            screen.blit(text, text_box)
-        
-            text = font.render(f"Score (Human): {players[1].score}", True, bar2.color)
-            text_box = text.get_rect()
-            text_box.topleft = (10,50)
-            screen.blit(text, text_box)
-
-            draw_timer(time_limit, font, screen, cmap, t)
-
+        profiler.lap("events")
+
+        if match.done == 0:
+            # as many fixed ticks as the wall time since the last frame covers; the
+            # leftover fraction of a tick interpolates the planes' drawn positions
+            accumulator += min(dt, max_frame_ms)
+            while accumulator >= tick_ms and match.done == 0:
+                act_ai([match], obs_buf)
+                profiler.lap("act")
+                match.tick()
+                accumulator -= tick_ms
+            if match.done == 1:
+                print("Time limit was reached")
+
+        if match.done == 0:
+            draw_frame(
+                renderer, font, timer, match.targets, match.pickups, match.players, *match.bars, match.t, profiler,
+                positions=match.positions(accumulator / tick_ms), labels=match.labels
+            )
         else:
-            msg1, msg = game_over_info(done, players, bar, bar2)
-                
-            text = font_large.render(f"{msg1} {msg} Rematch? (y/n)", True, (255, 255, 255))
-            text_box = text.get_rect()
-            text_box.center = (400, 400)
-            screen.blit(text, text_box)
-    
-        pygame.display.update()
-        dt = clock.tick(fps)
-        
-        t += dt
-
-        if (t / 1000) >= time_limit and done == 0:
-            print("Time limit was reached")
-            done=1
-
+            msg1, msg = game_over_info(match.done, match.players, *match.bars, match.labels)
+            renderer.text("message", font_large, f"{msg1} {msg} Rematch? (y/n)", (255, 255, 255), center=(400, 400))
+
+        dirty = renderer.render()
+        profiler.lap("draw")
+        if args.overlay:
+            area = profiler.draw(screen, font)
+            if area is not None:
+                renderer.mark(area)
+                dirty.append(area)
+            profiler.lap("overlay")
+        pygame.display.update(dirty)
+        profiler.lap("display")
+        # the wait for the next frame is left out: frame time is the work against the budget
+        profiler.end_frame()
+        dt = clock.tick(render_fps)
+
+    if recorder is not None:
+        recorder.close()
+    if args.profile is not None:
+        profiler.export(args.profile)
+        print(profiler.report())
     pygame.quit()
 
 if __name__=="__main__":
@@ -1,177 +1,456 @@
+import math
+import os
+
+from copy import deepcopy
+
 import gymnasium as gym
 import pygame
 import numpy as np
 
-from yaml import safe_load
 from gymnasium import spaces
 from pygame.locals import *
 
+from collision import CollisionGrid
+from config import load_config
+from entities import EntityStore, collect
+from frame_buffer import FrameBuffer
+from kernel import DONE, HIT, STATE_SIZE, TRUNCATED, get_kernel, make_params
+from observation import OBS_SIZE, get_obs
+from physics import straight_line_ticks, swept_circle_hits
+from planning import SPAWN, STATE_SIZE as SNAPSHOT_SIZE
 from pickup import ReplenishFuel
 from player import Player
+from profiler import NULL_PROFILER, Profiler
+from recorder import TrajectoryWriter, snapshot
+from spawn import SpawnQueue
 from status import StatusBar
 from target import Target
 
-def update_targets(targets, coll_idx):
-    remaining_targets = [elem for idx, elem in enumerate(targets) if idx not in coll_idx]
-    if not remaining_targets:
-        remaining_targets = [Target(np.random.randint(100, 700, size=(2,)), (80,80))]
-    return remaining_targets
+def update_targets(targets, coll_idx, spawns, index=None):
+    return collect(targets, coll_idx, spawns, index)
 
-def update_pickups(pickups, coll_idx):
-    remaining_pickups = [elem for idx, elem in enumerate(pickups) if idx not in coll_idx]
-    if not remaining_pickups:
-        remaining_pickups = [ReplenishFuel(np.random.randint(100, 700, size=(2,)), (80,80))]
-    return remaining_pickups
+def update_pickups(pickups, coll_idx, spawns, index=None):
+    return collect(pickups, coll_idx, spawns, index)
 
 class GameEnv(gym.Env):
+
+    metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
     
-    def __init__(self, config_file, render=False) -> None:
+    def __init__(
+        self, config_file, render=False, render_mode=None, obs_type="vector", frame_size=None, grayscale=False, frame_stack=1
+    ) -> None:
         super(GameEnv, self).__init__()
 
-        with open(config_file, "r") as fin:
-            self.config = safe_load(fin)
+        self.config = load_config(config_file)
         
         self.screen_size = self.config["view"]["width"], self.config["view"]["height"]
         width, height = self.screen_size
         self.fps = self.config["game"]["fps"]
-
-        if render:
+        env_config = self.config.get("env", {})
+        # the action is applied action_repeat times per step, each followed by physics_ticks ticks
+        self.action_repeat = env_config.get("action_repeat", 5)
+        self.physics_ticks = env_config.get("physics_ticks", 1)
+        self.fast_step = env_config.get("fast_step", False)
+        # whole action-repeat blocks in kernel.run_block, compiled when numba is installed
+        self.kernel = get_kernel() if env_config.get("kernel", False) else None
+
+        if render and render_mode is None:
+            render_mode = "human"
+        self.render_mode = render_mode
+        self.obs_type = obs_type
+        self.draw_sprites = render_mode is not None or obs_type == "pixels"
+
+        if self.draw_sprites:
+            if render_mode != "human":
+                # draw offscreen, no window or display server needed
+                os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
             pygame.init()
             pygame.font.init()
             self.font = pygame.font.Font('freesansbold.ttf', 20)
-            self.screen = pygame.display.set_mode((width, height))
-            self.clock = pygame.time.Clock()
-
-        self.player = Player(**self.config["player"])
-        self.targets = [Target(pos=np.array([100,100]), size=(80, 80))]
-        self.pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80))]
+            if render_mode == "human":
+                self.screen = pygame.display.set_mode((width, height))
+                self.clock = pygame.time.Clock()
+            elif pygame.display.get_surface() is None:
+                # sprites need a video mode for convert_alpha
+                pygame.display.set_mode((1, 1))
+            self.frames = FrameBuffer(self.screen_size, frame_size, grayscale, frame_stack)
+
+        self.player = Player(**deepcopy(self.config["player"]), render=self.draw_sprites)
+        # targets and pickups of this env live in its own store
+        self.entities = EntityStore()
+        self.targets = [Target(pos=np.array([100,100]), size=(80, 80), render=self.draw_sprites, store=self.entities)]
+        self.pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80), render=self.draw_sprites, store=self.entities)]
+        self.target_index = CollisionGrid.from_items(self.targets, self.screen_size, store=self.entities)
+        self.pickup_index = CollisionGrid.from_items(self.pickups, self.screen_size, store=self.entities)
         self.bar = StatusBar()
+        # unseeded until the first reset(seed=...)
+        self.spawns = SpawnQueue([self.np_random])
 
         self.target_counter = 0
         self.reward = 0
         self.time = 0.0
         self.time_limit = 300
+        player_cfg = self.config["player"]
+        self.kernel_params = make_params(
+            self.screen_size, self.fps, player_cfg["min_speed"], player_cfg["max_speed"], player_cfg["speed_delta"],
+            player_cfg["angle_delta"], self.time_limit, self.bar.max_value
+        )
+        self.kernel_state = np.zeros(STATE_SIZE, dtype=np.float64)
+        self.recorder = None
+        self.profiler = NULL_PROFILER
+        self.episode = -1
+        self.steps = 0
         self.time_since_last_point = 0.0
 
         self.action_space = spaces.Discrete(5)
-        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(9,))
+        if obs_type == "pixels":
+            self.observation_space = self.frames.observation_space
+        else:
+            self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(OBS_SIZE,))
 
     def reset(self, seed=None, **kwargs):
-        self.player = Player(**self.config["player"])
-        self.targets = [Target(pos=np.array([100, 100]), size=(80, 80))]
-        self.pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80))]
+        super().reset(seed=seed)
+        if seed is not None:
+            # np_random was reseeded; later resets without a seed keep drawing from the same stream
+            self.spawns = SpawnQueue([self.np_random])
+
+        self.player = Player(**deepcopy(self.config["player"]), render=self.draw_sprites)
+        # the previous episode's rows go back to the store before the new ones are taken
+        for item in self.targets + self.pickups:
+            item.despawn()
+        self.targets = [Target(pos=np.array([100, 100]), size=(80, 80), render=self.draw_sprites, store=self.entities)]
+        self.pickups = [ReplenishFuel(pos=np.array([600, 600]), size=(80, 80), render=self.draw_sprites, store=self.entities)]
+        self.target_index = CollisionGrid.from_items(self.targets, self.screen_size, store=self.entities)
+        self.pickup_index = CollisionGrid.from_items(self.pickups, self.screen_size, store=self.entities)
         self.target_counter = 0
         self.reward = 0
         self.time = 0.0
         self.bar.value = 100
         self.time_since_last_point = 0.0
-        
+        self.episode += 1
+        self.steps = 0
+        if self.recorder is not None:
+            self._record(-1, 0.0, False, False)
+
+        if self.obs_type == "pixels":
+            self.draw(self.frames.surface)
+            return self.frames.push(reset=True), {}
         return self.get_obs(), {}
     
     def get_obs(self):
-
-        angle_to_ox = self.player.angle / 180 * np.pi
-        speed = self.player.speed
-        distance_to_target = np.linalg.norm(self.player.pos-self.targets[0].pos)/500
-        angle_to_target = np.arctan2(self.targets[0].pos[1]-self.player.pos[1],self.targets[0].pos[0]-self.player.pos[0])
-        
-        distance_to_pickup = np.linalg.norm(self.player.pos-self.pickups[0].pos)/500
-        angle_to_pickup = np.arctan2(self.pickups[0].pos[1]-self.player.pos[1],self.pickups[0].pos[0]-self.player.pos[0])
-
-        return np.array(
-            [
-                angle_to_ox,
-                speed,
-                distance_to_target,
-                angle_to_target,
-                distance_to_pickup,
-                angle_to_pickup,
-                self.player.angle - angle_to_target,
-                self.player.angle - angle_to_pickup,
-                self.bar.value
-            ]
-        ).astype(np.float32)
+        if self.obs_type == "pixels":
+            self.draw(self.frames.surface)
+            return self.frames.push()
+        return get_obs(self.player, self.targets[0], self.pickups[0], self.bar)
     
     def step(self, action):
 
+        self.profiler.start_frame()
         self.reward = 0.0
         action = int(action)
 
-        for _ in range(5):
-            self.time += 1 / self.fps
-            #self.time_since_last_point += 1 / self.fps
+        if self.kernel is not None:
+            done, truncated = self._kernel_step(action)
+            self.profiler.lap("kernel")
+        elif self.fast_step:
+            done, truncated = self._fast_step(action)
+            self.profiler.lap("fast_step")
+        else:
+            done = False
+            truncated = False
+            for _ in range(self.action_repeat):
+                self.player.env_act(action)
+                for _ in range(self.physics_ticks):
+                    done, truncated = self._tick()
+                    if done or truncated:
+                        break
+                if done or truncated:
+                    break
+
+        obs = self.get_obs()
+        self.profiler.lap("obs")
+
+        self.steps += 1
+        if self.recorder is not None:
+            self._record(action, self.reward, done, truncated)
+            self.profiler.lap("record")
+        self.profiler.end_frame()
 
-            self.player.env_act(action)
-            self.player.update(self.screen_size)
+        info = {}
 
-            dist = np.linalg.norm(self.player.pos-self.targets[0].pos)/500
-            self.reward += 1 / self.fps
-            self.reward -= dist / self.fps
+        return (
+            obs,
+            self.reward,
+            done,
+            truncated,
+            info
+        )
 
-            dist_pickup = np.linalg.norm(self.player.pos-self.pickups[0].pos)/500
-            self.reward -= dist_pickup / self.fps
+    def _tick(self):
+        self.time += 1 / self.fps
+        #self.time_since_last_point += 1 / self.fps
+
+        self.player.update(self.screen_size)
+        self.profiler.lap("physics")
+
+        # sqrt(dx * dx + dy * dy) rather than np.linalg.norm, whose BLAS may fuse the
+        # multiply-add; kernel.run_block and planning.rollout_batch match it bit for bit
+        x, y = self.player.pos
+        dx = x - self.targets[0].pos[0]
+        dy = y - self.targets[0].pos[1]
+        dist = math.sqrt(dx * dx + dy * dy)/500
+        self.reward += 1 / self.fps
+        self.reward -= dist / self.fps
+
+        dx = x - self.pickups[0].pos[0]
+        dy = y - self.pickups[0].pos[1]
+        dist_pickup = math.sqrt(dx * dx + dy * dy)/500
+        self.reward -= dist_pickup / self.fps
+        self.profiler.lap("reward")
+
+        coll_idx = self.player.check_points(self.targets, self.target_index)
+        if coll_idx:
+            #self.time_since_last_point = 0.0
+            self.targets = update_targets(self.targets, coll_idx, self.spawns, self.target_index)
+            self.reward += 20
+
+        coll_idx = self.player.check_pickups(self.pickups, self.bar, self.pickup_index)
+        if coll_idx:
+            self.pickups = update_pickups(self.pickups, coll_idx, self.spawns, self.pickup_index)
+            self.reward += 10
+        self.profiler.lap("collisions")
+
+        self.bar.update(self.player.get_fuel_delta())
+        self.profiler.lap("fuel")
+
+        if (self.time > self.time_limit):
+            return True, False
+        elif (self.bar.value <= 0):
+            return False, True
+        #elif self.time_since_last_point > 60:
+        #    self.reward -= 1000
+        #    return False, True
+        return False, False
+
+    def _fast_step(self, action):
+        # every tick of the step in one vectorized pass: positions in closed form,
+        # swept-circle collisions, and only the ticks with an event handled one by one
+        repeats = []
+        for _ in range(self.action_repeat):
+            self.player.env_act(action)
+            repeats.append((self.player.speed, self.player.angle, self.player.direction, self.player.get_fuel_delta()))
+        speeds, angles, directions, fuel_deltas = zip(*repeats)
 
-            coll_idx = self.player.check_points(self.targets)
+        starts, steps, ends = straight_line_ticks(
+            self.player.pos, speeds, directions, self.physics_ticks, self.screen_size
+        )
+        n_ticks = len(ends)
+        fuel_deltas = np.repeat(fuel_deltas, self.physics_ticks)
+        # accumulate exactly like repeated `self.time += 1 / fps`
+        times = np.cumsum(np.concatenate([[self.time], np.full(n_ticks, 1 / self.fps)]))[1:]
+
+        done = False
+        truncated = False
+        tick = 0
+        while tick < n_ticks:
+            seg = slice(tick, n_ticks)
+            dist = np.linalg.norm(ends[seg] - self.targets[0].pos, axis=1) / 500
+            dist_pickup = np.linalg.norm(ends[seg] - self.pickups[0].pos, axis=1) / 500
+            slots = [item.slot for item in self.targets + self.pickups]
+            hits = swept_circle_hits(
+                starts[seg], steps[seg], self.entities.pos[slots], self.entities.radius[slots], self.screen_size
+            )
+            fuel = np.cumsum(np.concatenate([[self.bar.value], fuel_deltas[seg]]))[1:]
+            events = hits.any(axis=0) | (fuel <= 0) | (times[seg] > self.time_limit)
+            last = int(np.argmax(events)) if events.any() else n_ticks - tick - 1
+            target_hits = hits[:len(self.targets), last]
+            pickup_hits = hits[len(self.targets):, last]
+
+            # every tick up to and including the event one, before its hits are resolved
+            self.reward += (last + 1) / self.fps
+            self.reward -= (dist[:last + 1].sum() + dist_pickup[:last + 1].sum()) / self.fps
+            if last > 0:
+                self.bar.value = max(0, min(self.bar.max_value, fuel[last - 1]))
+
+            coll_idx = np.flatnonzero(target_hits).tolist()
             if coll_idx:
-                #self.time_since_last_point = 0.0
-                self.targets = update_targets(self.targets, coll_idx)
+                self.player.score += len(coll_idx)
+                self.targets = update_targets(self.targets, coll_idx, self.spawns, self.target_index)
                 self.reward += 20
 
-            coll_idx = self.player.check_pickups(self.pickups, self.bar)
+            coll_idx = np.flatnonzero(pickup_hits).tolist()
             if coll_idx:
-                self.pickups = update_pickups(self.pickups, coll_idx)
+                for idx in coll_idx:
+                    self.pickups[idx].apply(self.bar)
+                self.pickups = update_pickups(self.pickups, coll_idx, self.spawns, self.pickup_index)
                 self.reward += 10
 
-            self.bar.update(self.player.get_fuel_delta())
-           
-            done = False
-            truncated = False
+            tick += last
+            self.bar.update(fuel_deltas[tick])
+            self.time = times[tick]
             if (self.time > self.time_limit):
                 done = True
                 break
             elif (self.bar.value <= 0):
                 truncated = True
                 break
-            #elif self.time_since_last_point > 60:
-            #    self.reward -= 1000
-            #    truncated = True
-            #    break
-            else:
-                done = False
-
-            # self.render()
-
-        
-        info = {}
+            tick += 1
+
+        tick = min(tick, n_ticks - 1)
+        # the plane ends up wherever the last played tick left it
+        self.player.pos[0], self.player.pos[1] = float(ends[tick, 0]), float(ends[tick, 1])
+        repeat = tick // self.physics_ticks
+        self.player.speed = speeds[repeat]
+        self.player.angle = angles[repeat]
+        self.player.direction = directions[repeat]
+        return done, truncated
+
+    def _kernel_step(self, action):
+        # the kernel returns after every tick that hits something; the respawn happens
+        # here, like in _tick, and the block resumes on the next tick
+        state = self.kernel_state
+        state[:] = (
+            self.player.pos[0], self.player.pos[1], self.player.speed, self.player.angle,
+            self.player.direction[0], self.player.direction[1], self.bar.value, self.time, self.reward
+        )
+        n_ticks = self.action_repeat * self.physics_ticks
+        done = False
+        truncated = False
+        tick = 0
+        while tick < n_ticks:
+            slots = [item.slot for item in self.targets + self.pickups]
+            hits = np.zeros(len(slots), dtype=np.int8)
+            tick, flags = self.kernel(
+                state, action, tick, n_ticks, self.physics_ticks, self.entities.pos[slots],
+                self.entities.radius[slots], len(self.targets), self.kernel_params, hits
+            )
+            if flags & HIT:
+                n_targets = len(self.targets)
+                coll_idx = np.flatnonzero(hits[:n_targets]).tolist()
+                if coll_idx:
+                    self.player.score += len(coll_idx)
+                    self.targets = update_targets(self.targets, coll_idx, self.spawns, self.target_index)
+                coll_idx = np.flatnonzero(hits[n_targets:]).tolist()
+                if coll_idx:
+                    self.pickups = update_pickups(self.pickups, coll_idx, self.spawns, self.pickup_index)
+            done = bool(flags & DONE)
+            truncated = bool(flags & TRUNCATED)
+            if done or truncated:
+                break
 
-        return (
-            self.get_obs(),
-            self.reward,
-            done,
-            truncated,
-            info
+        x, y, speed, angle, dir_x, dir_y, fuel, time, reward = state.tolist()
+        self.player.pos[0], self.player.pos[1] = x, y
+        self.player.speed = speed
+        self.player.angle = angle
+        self.player.direction = (dir_x, dir_y)
+        self.player.last_action = action
+        self.bar.value = fuel
+        self.time = time
+        self.reward = reward
+        return done, truncated
+
+    def get_state(self, out=None):
+        # everything step() depends on as one flat float64 row (layout in planning.py),
+        # including the respawn stream; the frame stack and the recorder are left out
+        if out is None:
+            out = np.empty(SNAPSHOT_SIZE, dtype=np.float64)
+        player = self.player
+        target = self.targets[0].pos
+        pickup = self.pickups[0].pos
+        out[:SPAWN.start] = (
+            player.pos[0], player.pos[1], player.speed, player.angle, player.direction[0], player.direction[1],
+            player.angle_delta, player.score, player.last_action, self.bar.value, self.time,
+            self.time_since_last_point, self.reward, self.target_counter, self.steps, self.episode,
+            target[0], target[1], pickup[0], pickup[1]
+        )
+        self.spawns.get_state(out=out[SPAWN].view(np.uint64))
+        return out
+
+    def set_state(self, state):
+        (
+            x, y, speed, angle, dir_x, dir_y, angle_delta, score, last_action, fuel, time,
+            since_point, reward, target_counter, steps, episode, target_x, target_y, pickup_x, pickup_y
+        ) = state[:SPAWN.start].tolist()
+        player = self.player
+        player.pos[0], player.pos[1] = x, y
+        player.speed = speed
+        player.angle = angle
+        player.direction = (dir_x, dir_y)
+        player.angle_delta = angle_delta
+        player.score = int(score)
+        player.last_action = int(last_action)
+        self.bar.value = fuel
+        self.time = time
+        self.time_since_last_point = since_point
+        self.reward = reward
+        self.target_counter = int(target_counter)
+        self.steps = int(steps)
+        self.episode = int(episode)
+        self._place(self.targets[0], self.target_index, target_x, target_y)
+        self._place(self.pickups[0], self.pickup_index, pickup_x, pickup_y)
+        self.spawns.set_state(state[SPAWN].view(np.uint64))
+
+    def _place(self, item, index, x, y):
+        # the collision grid is only touched when the item actually moved
+        pos = item.pos
+        if pos[0] != x or pos[1] != y:
+            item.respawn((x, y))
+            index.move(item, item.pos)
+
+    def profile(self, budget_ms=None, **kwargs):
+        # per-phase step timings; read them with self.profiler.report() or .export(path)
+        self.profiler = Profiler(budget_ms=budget_ms, **kwargs)
+        return self.profiler
+
+    def record(self, path, chunk_size=1024):
+        # stream one row per step (plus the initial state of every episode) to `path`
+        if self.recorder is not None:
+            self.recorder.close()
+        self.recorder = TrajectoryWriter(path, chunk_size=chunk_size, meta={"source": "GameEnv"})
+        return self.recorder
+
+    def _record(self, action, reward, done, truncated):
+        self.recorder.append(
+            episode=self.episode,
+            step=self.steps,
+            time=self.time,
+            reward=reward,
+            done=done,
+            truncated=truncated,
+            **snapshot([self.player], [self.bar], self.targets, self.pickups),
+            action=action
         )
 
-    def render(self):
-        pygame.event.get()
-        self.screen.fill((118, 170, 176))
+    def draw(self, screen):
+        screen.fill((118, 170, 176))
 
-        self.player.draw(self.screen)
+        self.player.draw(screen)
         for target in self.targets:
-            target.draw(self.screen)
-        self.bar.draw(self.screen)
+            target.draw(screen)
+        self.bar.draw(screen)
         for pickup in self.pickups:
-            pickup.draw(self.screen)
+            pickup.draw(screen)
 
         text = self.font.render(f"Score: {self.player.score}", True, (255,255,255))
         text_box = text.get_rect()
         text_box.topleft = (10,20)
-        self.screen.blit(text, text_box)
+        screen.blit(text, text_box)
+
+    def render(self):
+        if self.render_mode == "rgb_array":
+            # (height, width, 3) view of the offscreen frame, no copy
+            self.draw(self.frames.surface)
+            return self.frames.rgb()
+
+        pygame.event.get()
+        self.draw(self.screen)
 
         pygame.display.update()
         self.clock.tick(self.fps)
 
     def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
         return super().close()
 
         
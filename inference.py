@@ -0,0 +1,131 @@
+import time
+
+import numpy as np
+
+ACTIVATIONS = {
+    "ReLU": lambda x: np.maximum(x, 0, out=x),
+    "Tanh": lambda x: np.tanh(x, out=x),
+}
+
+
+class QNetwork:
+    # NumPy forward pass of an SB3 DQN q-network (Linear/activation stack)
+
+    def __init__(self, layers, exploration_rate=0.0):
+        # layers: list of (weight [in, out], bias [out], activation name or None)
+        self.layers = [
+            (np.ascontiguousarray(weight, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+            for weight, bias, activation in layers
+        ]
+        self.n_actions = self.layers[-1][1].shape[0]
+        # DQN.predict keeps acting epsilon-greedily with the final exploration rate
+        self.exploration_rate = exploration_rate
+
+    @classmethod
+    def from_sb3(cls, model):
+        modules = list(model.policy.q_net.q_net)
+        layers = []
+        for idx, module in enumerate(modules):
+            if type(module).__name__ != "Linear":
+                continue
+            activation = None
+            if idx + 1 < len(modules) and type(modules[idx + 1]).__name__ in ACTIVATIONS:
+                activation = type(modules[idx + 1]).__name__
+            layers.append((
+                module.weight.detach().cpu().numpy().T,
+                module.bias.detach().cpu().numpy(),
+                activation
+            ))
+        return cls(layers, exploration_rate=model.exploration_rate)
+
+    def q_values(self, obs):
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, self.layers[0][0].shape[0])
+        for weight, bias, activation in self.layers:
+            x = x @ weight
+            x += bias
+            if activation is not None:
+                ACTIVATIONS[activation](x)
+        return x
+
+    def predict(self, obs, rng=None, exploration_rate=None):
+        # exploration_rate overrides the network's own for this call only, since
+        # model_registry shares one network per checkpoint across the process
+        if exploration_rate is None:
+            exploration_rate = self.exploration_rate
+        actions = self.q_values(obs).argmax(axis=1)
+        if rng is not None and exploration_rate > 0:
+            explore = rng.random(len(actions)) < exploration_rate
+            if explore.any():
+                actions[explore] = rng.integers(self.n_actions, size=int(explore.sum()))
+        return actions
+
+
+class LatencyStats:
+
+    def __init__(self, window=1000):
+        self.latencies = np.zeros(window, dtype=np.float64)
+        self.batch_sizes = np.zeros(window, dtype=np.int64)
+        self.calls = 0
+        self.total_obs = 0
+        self.total_time = 0.0
+
+    def record(self, seconds, batch_size):
+        slot = self.calls % len(self.latencies)
+        self.latencies[slot] = seconds
+        self.batch_sizes[slot] = batch_size
+        self.calls += 1
+        self.total_obs += batch_size
+        self.total_time += seconds
+
+    def summary(self):
+        if self.calls == 0:
+            return {"calls": 0}
+        recent = self.latencies[:min(self.calls, len(self.latencies))] * 1e6
+        return {
+            "calls": self.calls,
+            "observations": self.total_obs,
+            "mean_us": self.total_time / self.calls * 1e6,
+            "mean_us_per_obs": self.total_time / self.total_obs * 1e6,
+            "p50_us": float(np.percentile(recent, 50)),
+            "p99_us": float(np.percentile(recent, 99)),
+            "max_us": float(recent.max()),
+        }
+
+
+class DQNInference:
+    # the two-network policy used by DQNPlayer: `net` while fuel is at or above
+    # `fuel_threshold`, `low_fuel_net` (fed a fuel reading of `refuel_value`) below it
+
+    def __init__(self, net, low_fuel_net, fuel_threshold=30.0, refuel_value=95.0):
+        self.net = net
+        self.low_fuel_net = low_fuel_net
+        self.fuel_threshold = fuel_threshold
+        self.refuel_value = refuel_value
+        self.rng = np.random.default_rng()
+        self.stats = LatencyStats()
+
+    @classmethod
+    def from_sb3(cls, model, low_fuel_model, **kwargs):
+        return cls(QNetwork.from_sb3(model), QNetwork.from_sb3(low_fuel_model), **kwargs)
+
+    def predict(self, obs, deterministic=False):
+        start = time.perf_counter()
+        rng = None if deterministic else self.rng
+        obs = np.asarray(obs, dtype=np.float32).reshape(-1, self.net.layers[0][0].shape[0])
+        low_fuel = obs[:, -1] < self.fuel_threshold
+
+        if not low_fuel.any():
+            actions = self.net.predict(obs, rng)
+        elif low_fuel.all():
+            low_obs = obs.copy()
+            low_obs[:, -1] = self.refuel_value
+            actions = self.low_fuel_net.predict(low_obs, rng)
+        else:
+            actions = np.empty(len(obs), dtype=np.int64)
+            actions[~low_fuel] = self.net.predict(obs[~low_fuel], rng)
+            low_obs = obs[low_fuel]
+            low_obs[:, -1] = self.refuel_value
+            actions[low_fuel] = self.low_fuel_net.predict(low_obs, rng)
+
+        self.stats.record(time.perf_counter() - start, len(obs))
+        return actions
@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+
+# state vector of one plane, read and written in place by run_block
+X, Y, SPEED, ANGLE, DIR_X, DIR_Y, FUEL, TIME, REWARD = range(9)
+STATE_SIZE = 9
+
+# constants, see make_params
+WIDTH, HEIGHT, FPS, MIN_SPEED, MAX_SPEED, SPEED_DELTA, ANGLE_DELTA, TIME_LIMIT, MAX_FUEL = range(9)
+
+# bits of the returned flags
+HIT = 1
+DONE = 2
+TRUNCATED = 4
+
+
+def make_params(screen_size, fps, min_speed, max_speed, speed_delta, angle_delta, time_limit, max_fuel=100):
+    return np.array(
+        [screen_size[0], screen_size[1], fps, min_speed, max_speed, speed_delta, angle_delta, time_limit, max_fuel],
+        dtype=np.float64
+    )
+
+
+def run_block(state, action, start, n_ticks, physics_ticks, centers, radii, n_targets, params, hits):
+    # ticks start..n_ticks-1 of one GameEnv.step, with the same arithmetic, in the same
+    # order, as Player.env_act (on every tick that starts a repeat), Player.update, the
+    # reward, Player.check_points/check_pickups and StatusBar.update. Rows of `centers`
+    # below n_targets are stars, the rest fuel pickups; rows 0 and n_targets are the
+    # ones the distance reward follows. Stops after the first tick that hits something
+    # (the caller respawns, then resumes at the returned tick) or ends the episode.
+    # Returns (ticks played so far, flags); hits[m] is set for every circle hit
+    width = params[WIDTH]
+    height = params[HEIGHT]
+    fps = params[FPS]
+    min_speed = params[MIN_SPEED]
+    max_speed = params[MAX_SPEED]
+    speed_delta = params[SPEED_DELTA]
+    angle_delta = params[ANGLE_DELTA]
+    time_limit = params[TIME_LIMIT]
+    max_fuel = params[MAX_FUEL]
+
+    x = state[X]
+    y = state[Y]
+    speed = state[SPEED]
+    angle = state[ANGLE]
+    dir_x = state[DIR_X]
+    dir_y = state[DIR_Y]
+    fuel = state[FUEL]
+    time = state[TIME]
+    reward = state[REWARD]
+
+    hits[:] = 0
+    flags = 0
+    tick = start
+    while tick < n_ticks:
+        if tick % physics_ticks == 0:
+            if action == 1:
+                speed = min(max_speed, speed + speed_delta)
+            elif action == 2:
+                speed = max(min_speed, speed - speed_delta)
+            elif action == 3:
+                angle = (angle - angle_delta) % 360
+            elif action == 4:
+                angle = (angle + angle_delta) % 360
+            heading = angle * (math.pi / 180)
+            dir_x = math.cos(heading)
+            dir_y = math.sin(heading)
+
+        time += 1 / fps
+        x = (x + speed * dir_x) % width
+        y = (y + speed * dir_y) % height
+
+        dx = x - centers[0, 0]
+        dy = y - centers[0, 1]
+        reward += 1 / fps
+        reward -= math.sqrt(dx * dx + dy * dy) / 500 / fps
+        dx = x - centers[n_targets, 0]
+        dy = y - centers[n_targets, 1]
+        reward -= math.sqrt(dx * dx + dy * dy) / 500 / fps
+
+        target_hit = False
+        pickup_hit = False
+        for m in range(len(radii)):
+            # wrapped distance, as in CollisionGrid
+            dx = abs(x - centers[m, 0])
+            dy = abs(y - centers[m, 1])
+            dx = min(dx, width - dx)
+            dy = min(dy, height - dy)
+            if math.sqrt(dx * dx + dy * dy) <= radii[m]:
+                hits[m] = 1
+                if m < n_targets:
+                    target_hit = True
+                else:
+                    pickup_hit = True
+                    fuel = max(0.0, min(max_fuel, fuel + 20))
+        if target_hit:
+            reward += 20
+        if pickup_hit:
+            reward += 10
+        if target_hit or pickup_hit:
+            flags |= HIT
+
+        t = (speed - min_speed) / (max_speed - min_speed)
+        fuel = max(0.0, min(max_fuel, fuel + -((1 - t) * 0.01 + t * 0.1)))
+
+        tick += 1
+        if time > time_limit:
+            flags |= DONE
+        elif fuel <= 0:
+            flags |= TRUNCATED
+        if flags:
+            break
+
+    state[X] = x
+    state[Y] = y
+    state[SPEED] = speed
+    state[ANGLE] = angle
+    state[DIR_X] = dir_x
+    state[DIR_Y] = dir_y
+    state[FUEL] = fuel
+    state[TIME] = time
+    state[REWARD] = reward
+    return tick, flags
+
+
+# the same function run by the interpreter, one scalar tick at a time. Nothing in it is
+# vectorized; without numba it gives identical results and only saves the per-tick
+# method calls and attribute lookups of GameEnv's own step
+run_block_python = run_block
+_compiled = []
+
+
+def jit_kernel():
+    # run_block compiled with numba, or None without it; numba is only imported
+    # here since its import alone takes about half a second
+    if not _compiled:
+        try:
+            import numba
+        except ImportError:
+            _compiled.append(None)
+        else:
+            _compiled.append(numba.njit(cache=True)(run_block))
+    return _compiled[0]
+
+
+def get_kernel(jit=True):
+    # the compiled kernel when numba is installed (and jit is asked for), else the fallback
+    kernel = jit_kernel() if jit else None
+    return kernel if kernel is not None else run_block_python
@@ -0,0 +1,119 @@
+import json
+import os
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+from inference import DQNInference, QNetwork
+
+# process-wide caches keyed by (absolute path, mtime) so rematches and repeated
+# players reuse what is already in memory, while retrained checkpoints reload
+_models = {}
+_qnetworks = {}
+_engines = {}
+
+
+def _key(path):
+    path = os.path.abspath(path)
+    return path, os.stat(path).st_mtime_ns
+
+
+def policy_dir(path):
+    # exported policy-only weights live next to the checkpoint:
+    # weights/rl_model_v1_10000000_steps.zip -> weights/rl_model_v1_10000000_steps.policy/
+    return os.path.splitext(path)[0] + ".policy"
+
+
+def get_model(path):
+    key = _key(path)
+    if key not in _models:
+        # deferred so that policy-only loading never imports SB3/torch
+        from stable_baselines3 import DQN
+        _models[key] = DQN.load(path)
+    return _models[key]
+
+
+def export_policy(path, out_dir=None):
+    out_dir = out_dir or policy_dir(path)
+    net = QNetwork.from_sb3(get_model(path))
+    os.makedirs(out_dir, exist_ok=True)
+
+    activations = []
+    for idx, (weight, bias, activation) in enumerate(net.layers):
+        np.save(os.path.join(out_dir, f"layer{idx}_weight.npy"), weight)
+        np.save(os.path.join(out_dir, f"layer{idx}_bias.npy"), bias)
+        activations.append(activation)
+
+    meta = {
+        "source": os.path.basename(path),
+        "source_mtime_ns": os.stat(path).st_mtime_ns,
+        "activations": activations,
+        "exploration_rate": net.exploration_rate,
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w") as fout:
+        json.dump(meta, fout, indent=2)
+    return out_dir
+
+
+def load_policy(out_dir, mmap_mode="r"):
+    with open(os.path.join(out_dir, "meta.json"), "r") as fin:
+        meta = json.load(fin)
+    layers = [
+        (
+            np.load(os.path.join(out_dir, f"layer{idx}_weight.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(out_dir, f"layer{idx}_bias.npy"), mmap_mode=mmap_mode),
+            activation
+        )
+        for idx, activation in enumerate(meta["activations"])
+    ]
+    return QNetwork(layers, exploration_rate=meta["exploration_rate"]), meta
+
+
+def get_qnetwork(path):
+    key = _key(path)
+    if key not in _qnetworks:
+        exported = policy_dir(path)
+        net = None
+        if os.path.isfile(os.path.join(exported, "meta.json")):
+            net, meta = load_policy(exported)
+            if meta["source_mtime_ns"] != key[1]:
+                # checkpoint changed after the export, fall back to the zip
+                net = None
+        if net is None:
+            net = QNetwork.from_sb3(get_model(path))
+        _qnetworks[key] = net
+    return _qnetworks[key]
+
+
+def get_engine(model_path, **kwargs):
+    key = (tuple(_key(path) for path in model_path), tuple(sorted(kwargs.items())))
+    if key not in _engines:
+        _engines[key] = DQNInference(get_qnetwork(model_path[0]), get_qnetwork(model_path[1]), **kwargs)
+    return _engines[key]
+
+
+def clear():
+    _models.clear()
+    _qnetworks.clear()
+    _engines.clear()
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("checkpoints", nargs="+", help="SB3 DQN .zip checkpoints")
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+    for path in args.checkpoints:
+        print(f"{path} -> {export_policy(path)}")
+
+
+if __name__ == "__main__":
+    main()
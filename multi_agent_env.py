@@ -0,0 +1,225 @@
+import numpy as np
+
+from gymnasium import spaces
+
+from config import load_config
+from observation import OBS_SIZE, write_obs_batch
+from spawn import SpawnQueue
+
+
+class MultiGameEnv:
+    # N planes in one world competing for a shared star and fuel pickup, with the
+    # PettingZoo parallel API (dicts keyed by agent name). Every plane sees the same
+    # 9 features as in GameEnv, so single-agent checkpoints can play against each other.
+    # State is one row per plane and a tick advances all of them at once; step_batch
+    # is the array-in/array-out core for self-play loops that skip the dicts
+
+    metadata = {"render_modes": [], "name": "starpilot_multi_v0", "is_parallelizable": True}
+
+    def __init__(self, config_file, n_agents=2) -> None:
+
+        self.config = load_config(config_file)
+
+        self.screen_size = self.config["view"]["width"], self.config["view"]["height"]
+        self.fps = self.config["game"]["fps"]
+        self.time_limit = self.config["game"]["time_limit"]
+        self.render_mode = None
+
+        player_cfg = self.config["player"]
+        self.init_pos = np.array(player_cfg["init_pos"], dtype=np.float64)
+        self.init_speed = player_cfg["init_speed"]
+        self.init_angle = player_cfg["init_angle"]
+        self.interval = [player_cfg["min_speed"], player_cfg["max_speed"]]
+        self.speed_delta = player_cfg["speed_delta"]
+        self.angle_delta = player_cfg["angle_delta"]
+
+        self.target_radius = 40.0
+        self.pickup_radius = 40.0
+        env_config = self.config.get("env", {})
+        self.action_repeat = env_config.get("action_repeat", 5)
+        self.physics_ticks = env_config.get("physics_ticks", 1)
+
+        self.n_agents = n_agents
+        self.possible_agents = [f"plane_{idx}" for idx in range(n_agents)]
+        self.agent_idx = {agent: idx for idx, agent in enumerate(self.possible_agents)}
+        self.agents = []
+
+        self.pos = np.zeros((n_agents, 2), dtype=np.float64)
+        self.speed = np.zeros(n_agents, dtype=np.float64)
+        self.angle = np.zeros(n_agents, dtype=np.float64)
+        self.fuel = np.zeros(n_agents, dtype=np.float64)
+        self.score = np.zeros(n_agents, dtype=np.int64)
+        self.alive = np.zeros(n_agents, dtype=bool)
+        self.target_pos = np.zeros(2, dtype=np.float64)
+        self.pickup_pos = np.zeros(2, dtype=np.float64)
+        self.time = 0.0
+        self.ticks = 0
+
+        self.buf_obs = np.zeros((n_agents, OBS_SIZE), dtype=np.float32)
+        self.spawns = SpawnQueue.from_seed(None)
+
+        self._observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(OBS_SIZE,))
+        self._action_space = spaces.Discrete(5)
+
+    def observation_space(self, agent):
+        return self._observation_space
+
+    def action_space(self, agent):
+        return self._action_space
+
+    @property
+    def num_agents(self):
+        return len(self.agents)
+
+    @property
+    def max_num_agents(self):
+        return self.n_agents
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            # same respawn stream as GameEnv.reset(seed=seed)
+            self.spawns = SpawnQueue([np.random.default_rng(seed)])
+
+        # every plane starts where game.main puts both of its players
+        self.pos[:] = self.init_pos
+        self.speed[:] = self.init_speed
+        self.angle[:] = self.init_angle
+        self.fuel[:] = 100
+        self.score[:] = 0
+        self.alive[:] = True
+        self.target_pos[:] = (100, 100)
+        self.pickup_pos[:] = (600, 600)
+        self.time = 0.0
+        self.ticks = 0
+        self.agents = list(self.possible_agents)
+
+        obs = self._get_obs()
+        return {agent: obs[idx].copy() for idx, agent in enumerate(self.agents)}, {agent: {} for agent in self.agents}
+
+    def _get_obs(self):
+        target_pos = np.broadcast_to(self.target_pos, self.pos.shape)
+        pickup_pos = np.broadcast_to(self.pickup_pos, self.pos.shape)
+        return write_obs_batch(self.buf_obs, self.angle, self.speed, self.pos, target_pos, pickup_pos, self.fuel)
+
+    def _winner(self, hit, dist):
+        # one plane per tick takes an item: the closest one, and on an exact distance tie
+        # the first in a priority order that rotates every tick, so no index is favoured
+        candidates = np.flatnonzero(hit)
+        if len(candidates) == 1:
+            return candidates[0]
+        priority = (candidates - self.ticks) % self.n_agents
+        return candidates[np.lexsort((priority, dist[candidates]))[0]]
+
+    def step_batch(self, actions):
+        # actions: (n_agents,) ints, ignored for planes that are out. Returns
+        # (obs, rewards, terminated, truncated) arrays over all n_agents planes
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.n_agents)
+        width, height = self.screen_size
+        dt = 1 / self.fps
+
+        speed_step = np.where(actions == 1, self.speed_delta, 0.0)
+        speed_step -= np.where(actions == 2, self.speed_delta, 0.0)
+        angle_step = np.where(actions == 3, -self.angle_delta, 0.0)
+        angle_step += np.where(actions == 4, self.angle_delta, 0.0)
+        speed_step[~self.alive] = 0.0
+        angle_step[~self.alive] = 0.0
+
+        rewards = np.zeros(self.n_agents, dtype=np.float64)
+        terminated = np.zeros(self.n_agents, dtype=bool)
+        truncated = np.zeros(self.n_agents, dtype=bool)
+        active = self.alive.copy()
+
+        for _ in range(self.action_repeat):
+            np.clip(self.speed + speed_step, self.interval[0], self.interval[1], out=self.speed)
+            np.mod(self.angle + angle_step, 360, out=self.angle)
+            heading = np.deg2rad(self.angle)
+            velocity_x = np.where(active, self.speed * np.cos(heading), 0.0)
+            velocity_y = np.where(active, self.speed * np.sin(heading), 0.0)
+            for _ in range(self.physics_ticks):
+                self.time += dt
+                self.ticks += 1
+
+                self.pos[:, 0] += velocity_x
+                self.pos[:, 1] += velocity_y
+                np.mod(self.pos[:, 0], width, out=self.pos[:, 0])
+                np.mod(self.pos[:, 1], height, out=self.pos[:, 1])
+
+                to_target = self.pos - self.target_pos
+                to_pickup = self.pos - self.pickup_pos
+                dist = np.sqrt(np.einsum("ij,ij->i", to_target, to_target))
+                dist_pickup = np.sqrt(np.einsum("ij,ij->i", to_pickup, to_pickup))
+
+                mask = active.astype(np.float64)
+                rewards += dt * mask
+                rewards -= dist / 500 / self.fps * mask
+                rewards -= dist_pickup / 500 / self.fps * mask
+
+                hit_target = (dist <= self.target_radius) & active
+                if hit_target.any():
+                    winner = self._winner(hit_target, dist)
+                    self.score[winner] += 1
+                    rewards[winner] += 20
+                    self.target_pos[:] = self.spawns.next()
+
+                hit_pickup = (dist_pickup <= self.pickup_radius) & active
+                if hit_pickup.any():
+                    winner = self._winner(hit_pickup, dist_pickup)
+                    self.fuel[winner] = min(100, self.fuel[winner] + 20)
+                    rewards[winner] += 10
+                    self.pickup_pos[:] = self.spawns.next()
+
+                t = (self.speed - self.interval[0]) / (self.interval[1] - self.interval[0])
+                fuel_delta = np.where(active, (1 - t) * 0.01 + t * 0.1, 0.0)
+                np.clip(self.fuel - fuel_delta, 0, 100, out=self.fuel)
+
+                # the clock runs out for everyone at once; fuel only for the plane that burnt it
+                if self.time > self.time_limit:
+                    terminated |= active
+                    active[:] = False
+                    break
+                fuel_out = active & (self.fuel <= 0)
+                if fuel_out.any():
+                    truncated |= fuel_out
+                    active &= ~fuel_out
+                    velocity_x[fuel_out] = 0.0
+                    velocity_y[fuel_out] = 0.0
+                    speed_step[fuel_out] = 0.0
+                    angle_step[fuel_out] = 0.0
+                    if not active.any():
+                        break
+            if not active.any():
+                break
+
+        self.alive = active
+        return self._get_obs(), rewards, terminated, truncated
+
+    def step(self, actions):
+        # actions: {agent: action} for the agents still in play, missing ones idle
+        action_array = np.zeros(self.n_agents, dtype=np.int64)
+        for agent, action in actions.items():
+            action_array[self.agent_idx[agent]] = action
+        live = [self.agent_idx[agent] for agent in self.agents]
+
+        obs, rewards, terminated, truncated = self.step_batch(action_array)
+
+        agents = self.agents
+        self.agents = [agent for agent in agents if self.alive[self.agent_idx[agent]]]
+        return (
+            {agent: obs[idx].copy() for agent, idx in zip(agents, live)},
+            {agent: float(rewards[idx]) for agent, idx in zip(agents, live)},
+            {agent: bool(terminated[idx]) for agent, idx in zip(agents, live)},
+            {agent: bool(truncated[idx]) for agent, idx in zip(agents, live)},
+            {agent: {"score": int(self.score[idx])} for agent, idx in zip(agents, live)},
+        )
+
+    def state(self):
+        # global view: every plane's row plus the shared star and pickup
+        return np.concatenate([
+            self.pos.ravel(), self.angle, self.speed, self.fuel, self.target_pos, self.pickup_pos
+        ]).astype(np.float32)
+
+    def render(self):
+        pass
+
+    def close(self):
+        pass
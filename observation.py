@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+
+# angle, speed, distance/bearing to target, distance/bearing to pickup,
+# plane angle relative to both bearings, fuel
+OBS_SIZE = 9
+
+
+def write_obs(out, angle, speed, pos, target_pos, pickup_pos, fuel):
+    px = float(pos[0])
+    py = float(pos[1])
+    tx = float(target_pos[0]) - px
+    ty = float(target_pos[1]) - py
+    ux = float(pickup_pos[0]) - px
+    uy = float(pickup_pos[1]) - py
+
+    angle_to_target = math.atan2(ty, tx)
+    angle_to_pickup = math.atan2(uy, ux)
+
+    out[0] = angle / 180 * math.pi
+    out[1] = speed
+    out[2] = math.sqrt(tx * tx + ty * ty) / 500
+    out[3] = angle_to_target
+    out[4] = math.sqrt(ux * ux + uy * uy) / 500
+    out[5] = angle_to_pickup
+    out[6] = angle - angle_to_target
+    out[7] = angle - angle_to_pickup
+    out[8] = fuel
+    return out
+
+
+def get_obs(player, target, pickup, bar, out=None):
+    if out is None:
+        out = np.empty(OBS_SIZE, dtype=np.float32)
+    return write_obs(out, player.angle, player.speed, player.pos, target.pos, pickup.pos, bar.value)
+
+
+def write_obs_batch(out, angle, speed, pos, target_pos, pickup_pos, fuel):
+    # same features as write_obs for every row; (dx * dx + dy * dy) keeps the
+    # distances identical to the scalar path
+    to_target = target_pos - pos
+    to_pickup = pickup_pos - pos
+    angle_to_target = np.arctan2(to_target[:, 1], to_target[:, 0])
+    angle_to_pickup = np.arctan2(to_pickup[:, 1], to_pickup[:, 0])
+    np.square(to_target, out=to_target)
+    np.square(to_pickup, out=to_pickup)
+
+    out[:, 0] = angle / 180 * math.pi
+    out[:, 1] = speed
+    out[:, 2] = np.sqrt(to_target[:, 0] + to_target[:, 1]) / 500
+    out[:, 3] = angle_to_target
+    out[:, 4] = np.sqrt(to_pickup[:, 0] + to_pickup[:, 1]) / 500
+    out[:, 5] = angle_to_pickup
+    out[:, 6] = angle - angle_to_target
+    out[:, 7] = angle - angle_to_pickup
+    out[:, 8] = fuel
+    return out
+
+
+def _reference_obs(angle, speed, pos, target_pos, pickup_pos, fuel):
+    # the original GameEnv.get_obs / game.get_obs_for_agent computation
+    distance_to_target = np.linalg.norm(pos - target_pos) / 500
+    angle_to_target = np.arctan2(target_pos[1] - pos[1], target_pos[0] - pos[0])
+    distance_to_pickup = np.linalg.norm(pos - pickup_pos) / 500
+    angle_to_pickup = np.arctan2(pickup_pos[1] - pos[1], pickup_pos[0] - pos[0])
+    return np.array(
+        [
+            angle / 180 * np.pi,
+            speed,
+            distance_to_target,
+            angle_to_target,
+            distance_to_pickup,
+            angle_to_pickup,
+            angle - angle_to_target,
+            angle - angle_to_pickup,
+            fuel
+        ]
+    ).astype(np.float32)
+
+
+def validate(n_samples=100000, seed=0):
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(0, 800, size=(n_samples, 2))
+    target_pos = rng.integers(100, 700, size=(n_samples, 2))
+    pickup_pos = rng.integers(100, 700, size=(n_samples, 2))
+    angle = 5.0 * rng.integers(0, 72, size=n_samples)
+    speed = rng.uniform(1, 10, size=n_samples)
+    fuel = rng.uniform(0, 100, size=n_samples)
+
+    batch = write_obs_batch(
+        np.empty((n_samples, OBS_SIZE), dtype=np.float32),
+        angle, speed, pos, target_pos, pickup_pos, fuel
+    )
+    row = np.empty(OBS_SIZE, dtype=np.float32)
+    mismatches = 0
+    for i in range(n_samples):
+        expected = _reference_obs(angle[i], speed[i], pos[i], target_pos[i], pickup_pos[i], fuel[i])
+        write_obs(row, angle[i], speed[i], pos[i], target_pos[i], pickup_pos[i], fuel[i])
+        if expected.tobytes() != row.tobytes() or expected.tobytes() != batch[i].tobytes():
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == "__main__":
+    n_samples = 100000
+    mismatches = validate(n_samples)
+    print(f"{mismatches} of {n_samples} observations differ from the reference features")
+    raise SystemExit(int(mismatches > 0))
@@ -0,0 +1,38 @@
+import numpy as np
+
+
+def straight_line_ticks(pos, speeds, directions, ticks, size):
+    # speed and heading are held for `ticks` ticks after each of the R action repeats,
+    # so every tick position follows from a cumulative sum of the per-tick velocity.
+    # Returns wrapped tick start points (N, 2), per-tick displacement (N, 2) and
+    # wrapped end points (N, 2) for N = R * ticks
+    velocity = np.repeat(np.asarray(speeds)[:, None] * np.asarray(directions), ticks, axis=0)
+    unwrapped = np.asarray(pos, dtype=np.float64) + np.cumsum(velocity, axis=0)
+    ends = np.mod(unwrapped, size)
+    starts = np.empty_like(ends)
+    starts[0] = np.mod(pos, size)
+    starts[1:] = ends[:-1]
+    return starts, velocity, ends
+
+
+def wrapped_delta(points, centers, size):
+    # shortest vectors from each center (M, 2) to each point (N, 2) on the torus, (M, N, 2)
+    size = np.asarray(size, dtype=np.float64)
+    return np.mod(points[None, :, :] - np.asarray(centers)[:, None, :] + size / 2, size) - size / 2
+
+
+def swept_circle_hits(starts, steps, centers, radii, size):
+    # (M, N): tick n hits circle m if it ends inside it, like the per-tick check, or
+    # its segment start -> start + step passes through it in between, so fast
+    # fly-throughs still count. A segment only leaving a circle is not a hit: its
+    # start was already checked as the previous tick's end
+    rel = wrapped_delta(starts, centers, size)
+    end = rel + steps
+    step_len2 = (steps * steps).sum(axis=1)
+    along = -(rel * steps).sum(axis=2)
+    u = np.divide(along, step_len2, out=np.zeros_like(along), where=step_len2 > 0)
+    closest = rel + np.clip(u, 0.0, 1.0)[:, :, None] * steps
+    radius2 = np.square(np.asarray(radii, dtype=np.float64))[:, None]
+    ends_inside = (end * end).sum(axis=2) <= radius2
+    passes = (u > 0) & (u < 1) & ((closest * closest).sum(axis=2) <= radius2)
+    return ends_inside | passes
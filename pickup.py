@@ -1,32 +1,35 @@
-import pygame
 import numpy as np
 
+from entities import Entity
 from player import Player
+from sprites import sprite_cache
 from status import StatusBar
 
 
-class Pickup(object):
-    def __init__(self, pos, size, img_path, render=False):
-        self.pos = pos
-        self.size = size
+class Pickup(Entity):
+
+    __slots__ = ("img_path",)
+
+    def __init__(self, pos, size, img_path, render=False, store=None):
+        super(Pickup, self).__init__(pos, size, store)
         self.img_path = img_path
         
         if render:
             self.set_sprite()
 
+    @property
+    def img(self):
+        return sprite_cache.get(self.img_path, self.size)
+
     def set_sprite(self):
-        self.img = pygame.image.load(self.img_path)
-        self.img.convert_alpha()
-        self.img = pygame.transform.scale(self.img, self.size)
+        # decodes and scales the sprite into the shared cache ahead of the first draw
+        self.img
+
+    def sprite(self):
+        return self.img, (self.pos[0] - int(self.size[0]/2), self.pos[1] - int(self.size[1]/2))
 
     def draw(self, screen):
-        screen.blit(
-            self.img,
-            (
-                self.pos[0] - int(self.size[0]/2),
-                self.pos[1] - int(self.size[1]/2)
-            )    
-        )
+        screen.blit(*self.sprite())
 
     def apply(self, subject):
         pass
@@ -36,8 +39,11 @@ class Pickup(object):
 
 class ReplenishFuel(Pickup):
 
-    def __init__(self, pos, size, img_path="assets/fuel.png", render=False):
-        super(ReplenishFuel, self).__init__(pos, size, img_path, render)
+    __slots__ = ()
+    kind = 1
+
+    def __init__(self, pos, size, img_path="assets/fuel.png", render=False, store=None):
+        super(ReplenishFuel, self).__init__(pos, size, img_path, render, store)
 
     def apply(self, subject):
         if isinstance(subject, StatusBar):
@@ -47,10 +53,19 @@ class ReplenishFuel(Pickup):
 
 class BetterPlane(Pickup):
 
-    def __init__(self, pos, size, img_path="assets/cog.png", render=False):
-        super(BetterPlane, self).__init__(pos, size, img_path, render)
-        self._func = lambda x: 2*x
-        self._inv_func = lambda x: x/2
+    __slots__ = ()
+    kind = 2
+
+    def __init__(self, pos, size, img_path="assets/cog.png", render=False, store=None):
+        super(BetterPlane, self).__init__(pos, size, img_path, render, store)
+
+    @staticmethod
+    def _func(x):
+        return 2*x
+
+    @staticmethod
+    def _inv_func(x):
+        return x/2
 
     def apply(self, subject):
         if isinstance(subject, Player):
@@ -0,0 +1,194 @@
+import numpy as np
+
+from observation import OBS_SIZE, write_obs_batch
+from spawn import STATE_SIZE as SPAWN_STATE_SIZE, pack_pcg64, unpack_pcg64
+
+# layout of GameEnv.get_state: one float64 row per snapshot
+(
+    PLAYER_X, PLAYER_Y, SPEED, ANGLE, DIR_X, DIR_Y, ANGLE_DELTA, SCORE, LAST_ACTION,
+    FUEL, TIME, SINCE_POINT, REWARD, TARGET_COUNTER, STEPS, EPISODE,
+    TARGET_X, TARGET_Y, PICKUP_X, PICKUP_Y
+) = range(20)
+# SpawnQueue.get_state, stored as raw uint64 bits; read it with state[SPAWN].view(np.uint64)
+SPAWN = slice(20, 20 + SPAWN_STATE_SIZE)
+STATE_SIZE = SPAWN.stop
+
+
+class SpawnReplay:
+    # replays the respawn streams packed in snapshots without a SpawnQueue per branch.
+    # Branches forked from one snapshot share their batches, so each batch is drawn once
+
+    def __init__(self, low=100, high=700, batch_size=64):
+        self.low = low
+        self.high = high
+        self.batch_size = batch_size
+        self.rng = np.random.Generator(np.random.PCG64())
+        # packed generator state -> (batch drawn from it, packed state after the draw)
+        self.batches = {}
+
+    @classmethod
+    def like(cls, spawns):
+        return cls(spawns.low, spawns.high, spawns.batch_size)
+
+    def _batch(self, words):
+        key = words.tobytes()
+        if key not in self.batches:
+            self.rng.bit_generator.state = unpack_pcg64(words)
+            batch = self.rng.integers(self.low, self.high, size=(self.batch_size, 2))
+            self.batches[key] = batch, pack_pcg64(self.rng.bit_generator.state, np.empty(6, dtype=np.uint64))
+        return self.batches[key]
+
+    def next(self, spawn_state):
+        # the position SpawnQueue.next would return; advances spawn_state (uint64 view) in place
+        cursor = int(spawn_state[6])
+        if cursor >= self.batch_size:
+            cursor = 0
+        batch, after = self._batch(spawn_state[:6])
+        pos = batch[cursor]
+        cursor += 1
+        if cursor == self.batch_size:
+            spawn_state[:6] = after
+        spawn_state[6] = cursor
+        return pos
+
+
+def rollout_batch(env, states, actions, replay=None):
+    # plays actions (B, H) from the snapshots states (B, STATE_SIZE) of `env`, all
+    # branches at once, with the tick-by-tick GameEnv.step arithmetic. A branch stops at
+    # its first done/truncated step. Returns (rewards (B, H), terminated (B,),
+    # truncated (B,), final states (B, STATE_SIZE)); rewards after a branch ends are 0.
+    # An env stepping through the kernel matches this bit for bit; the swept fast step
+    # does not, so such an env is refused rather than planned for with other physics
+    if env.fast_step and env.kernel is None:
+        raise ValueError("rollout_batch follows the tick-by-tick step; disable fast_step or use the kernel")
+    states = np.array(states, dtype=np.float64, ndmin=2)
+    actions = np.asarray(actions, dtype=np.int64).reshape(len(states), -1)
+    n_branches, horizon = actions.shape
+    if replay is None:
+        replay = SpawnReplay.like(env.spawns)
+
+    width, height = env.screen_size
+    fps = env.fps
+    min_speed, max_speed = env.player.interval
+    speed_delta = env.player.speed_delta
+    max_fuel = env.bar.max_value
+    target_radius = env.targets[0].radius
+    pickup_radius = env.pickups[0].radius
+
+    x = states[:, PLAYER_X].copy()
+    y = states[:, PLAYER_Y].copy()
+    speed = states[:, SPEED].copy()
+    angle = states[:, ANGLE].copy()
+    dir_x = states[:, DIR_X].copy()
+    dir_y = states[:, DIR_Y].copy()
+    angle_delta = states[:, ANGLE_DELTA]
+    score = states[:, SCORE].copy()
+    fuel = states[:, FUEL].copy()
+    time = states[:, TIME].copy()
+    targets = states[:, TARGET_X:TARGET_Y + 1].copy()
+    pickups = states[:, PICKUP_X:PICKUP_Y + 1].copy()
+    spawn_states = np.ascontiguousarray(states[:, SPAWN]).view(np.uint64)
+
+    rewards = np.zeros((n_branches, horizon), dtype=np.float64)
+    terminated = np.zeros(n_branches, dtype=bool)
+    truncated = np.zeros(n_branches, dtype=bool)
+    steps = np.zeros(n_branches, dtype=np.int64)
+    active = np.ones(n_branches, dtype=bool)
+
+    for step in range(horizon):
+        action = actions[:, step]
+        reward = np.zeros(n_branches, dtype=np.float64)
+        playing = active.copy()
+        for _ in range(env.action_repeat):
+            # Player.env_act
+            speed = np.where(playing & (action == 1), np.minimum(max_speed, speed + speed_delta), speed)
+            speed = np.where(playing & (action == 2), np.maximum(min_speed, speed - speed_delta), speed)
+            angle = np.where(playing & (action == 3), np.mod(angle - angle_delta, 360), angle)
+            angle = np.where(playing & (action == 4), np.mod(angle + angle_delta, 360), angle)
+            heading = np.deg2rad(angle)
+            dir_x = np.where(playing, np.cos(heading), dir_x)
+            dir_y = np.where(playing, np.sin(heading), dir_y)
+            t = (speed - min_speed) / (max_speed - min_speed)
+            fuel_delta = -((1 - t) * 0.01 + t * 0.1)
+
+            for _ in range(env.physics_ticks):
+                # GameEnv._tick
+                time = np.where(playing, time + 1 / fps, time)
+                x = np.where(playing, np.mod(x + speed * dir_x, width), x)
+                y = np.where(playing, np.mod(y + speed * dir_y, height), y)
+
+                # added term by term in the order of _tick; ended branches add exact zeros
+                reward += np.where(playing, 1 / fps, 0.0)
+                dx = x - targets[:, 0]
+                dy = y - targets[:, 1]
+                reward -= np.where(playing, np.sqrt(dx * dx + dy * dy) / 500 / fps, 0.0)
+                dx = x - pickups[:, 0]
+                dy = y - pickups[:, 1]
+                reward -= np.where(playing, np.sqrt(dx * dx + dy * dy) / 500 / fps, 0.0)
+
+                # wrapped distances, as in CollisionGrid.query
+                target_hit = playing & (wrapped_dist(x, y, targets, width, height) <= target_radius)
+                pickup_hit = playing & (wrapped_dist(x, y, pickups, width, height) <= pickup_radius)
+                for idx in np.flatnonzero(target_hit | pickup_hit):
+                    if target_hit[idx]:
+                        score[idx] += 1
+                        targets[idx] = replay.next(spawn_states[idx])
+                        reward[idx] += 20
+                    if pickup_hit[idx]:
+                        fuel[idx] = max(0, min(max_fuel, fuel[idx] + 20))
+                        pickups[idx] = replay.next(spawn_states[idx])
+                        reward[idx] += 10
+
+                fuel = np.where(playing, np.clip(fuel + fuel_delta, 0, max_fuel), fuel)
+
+                done = playing & (time > env.time_limit)
+                out_of_fuel = playing & ~done & (fuel <= 0)
+                terminated |= done
+                truncated |= out_of_fuel
+                playing &= ~(done | out_of_fuel)
+                if not playing.any():
+                    break
+            if not playing.any():
+                break
+
+        rewards[active, step] = reward[active]
+        steps += active
+        states[active, LAST_ACTION] = action[active]
+        states[active, REWARD] = reward[active]
+        active &= ~(terminated | truncated)
+        if not active.any():
+            break
+
+    states[:, PLAYER_X] = x
+    states[:, PLAYER_Y] = y
+    states[:, SPEED] = speed
+    states[:, ANGLE] = angle
+    states[:, DIR_X] = dir_x
+    states[:, DIR_Y] = dir_y
+    states[:, SCORE] = score
+    states[:, FUEL] = fuel
+    states[:, TIME] = time
+    states[:, STEPS] += steps
+    states[:, TARGET_X:TARGET_Y + 1] = targets
+    states[:, PICKUP_X:PICKUP_Y + 1] = pickups
+    states[:, SPAWN] = spawn_states.view(np.float64)
+    return rewards, terminated, truncated, states
+
+
+def wrapped_dist(x, y, centers, width, height):
+    dx = np.abs(x - centers[:, 0])
+    dy = np.abs(y - centers[:, 1])
+    dx = np.minimum(dx, width - dx)
+    dy = np.minimum(dy, height - dy)
+    return np.sqrt(dx * dx + dy * dy)
+
+
+def states_obs(states, out=None):
+    # the vector observation GameEnv.get_obs would return after set_state, per row
+    states = np.array(states, dtype=np.float64, ndmin=2)
+    if out is None:
+        out = np.empty((len(states), OBS_SIZE), dtype=np.float32)
+    return write_obs_batch(
+        out, states[:, ANGLE], states[:, SPEED], states[:, PLAYER_X:PLAYER_Y + 1],
+        states[:, TARGET_X:TARGET_Y + 1], states[:, PICKUP_X:PICKUP_Y + 1], states[:, FUEL]
+    )
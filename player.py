@@ -1,7 +1,9 @@
 import pygame
 import numpy as np
 
-from stable_baselines3 import DQN
+import model_registry
+
+from sprites import InvertChannels, sprite_cache
 
 class Player:
 
@@ -16,18 +18,18 @@ class Player:
         self.angle_delta = angle_delta
         self.direction = (np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle)))
         self.score = 0
+        # discrete action (0-4, as in env_act) behind the latest move, for recordings
+        self.last_action = 0
 
         if render:
             self.set_sprite()
 
     def set_sprite(self):
-        self.img = pygame.image.load("assets/plane.png")
-        self.img.convert_alpha()
-        self.img = pygame.transform.scale(self.img, (50,50))
-        self.img = pygame.transform.rotate(self.img, -90)
+        self.img = sprite_cache.get("assets/plane.png", (50,50), rotation=-90)
 
     def env_act(self, action):
 
+        self.last_action = int(action)
         if action == 0:
             pass
         if action == 1:
@@ -57,7 +59,13 @@ class Player:
         self.pos[0] = self.pos[0] % size[0]
         self.pos[1] = self.pos[1] % size[1]
 
-    def check_points(self, targets):
+    def check_points(self, targets, index=None):
+
+        if index is not None:
+            # the grid maps hits straight to their positions in targets
+            coll_idx = index.query_indices(self.pos)
+            self.score += len(coll_idx)
+            return coll_idx
 
         coll_idx = []
         for idx, target in enumerate(targets):
@@ -66,7 +74,13 @@ class Player:
                 coll_idx.append(idx)
         return coll_idx
     
-    def check_pickups(self, pickups, bar):
+    def check_pickups(self, pickups, bar, index=None):
+
+        if index is not None:
+            coll_idx = index.query_indices(self.pos)
+            for idx in coll_idx:
+                pickups[idx].apply(bar)
+            return coll_idx
         
         coll_idx = []
         for idx, pickup in enumerate(pickups):
@@ -76,16 +90,19 @@ class Player:
         return coll_idx
         
     
-    def draw(self, screen):
-        rotated_img = pygame.transform.rotate(self.img, -self.angle)
-        screen.blit(
-            rotated_img,
-            (
-                self.pos[0] - int(rotated_img.get_width()/2),
-                self.pos[1] - int(rotated_img.get_height()/2)
-            )    
+    def sprite(self, pos=None):
+        # (surface, topleft) this plane is drawn with, at pos if given (e.g. interpolated)
+        if pos is None:
+            pos = self.pos
+        rotated_img = sprite_cache.rotate(self.img, -self.angle)
+        return rotated_img, (
+            pos[0] - int(rotated_img.get_width()/2),
+            pos[1] - int(rotated_img.get_height()/2)
         )
 
+    def draw(self, screen):
+        screen.blit(*self.sprite())
+
 
 class HumanPlayer(Player):
     def __init__(
@@ -97,6 +114,9 @@ class HumanPlayer(Player):
 
     def act(self, obs=None):
         keys = pygame.key.get_pressed()
+        # several keys can be held at once; the first of up/down/left/right is recorded
+        pressed = [keys[pygame.K_UP], keys[pygame.K_DOWN], keys[pygame.K_LEFT], keys[pygame.K_RIGHT]]
+        self.last_action = pressed.index(True) + 1 if any(pressed) else 0
         if keys[pygame.K_UP]:
             self.speed = min(self.interval[1], self.speed+self.speed_delta)
         if keys[pygame.K_DOWN]:
@@ -117,6 +137,7 @@ class RandomPlayer(Player):
 
     def act(self, obs=None):
         act_idx = np.random.randint(0,4)
+        self.last_action = act_idx + 1
         
         if act_idx==0:
             self.speed = min(self.interval[1], self.speed + self.speed_delta)
@@ -128,52 +149,77 @@ class RandomPlayer(Player):
             self.angle = (self.angle + self.angle_delta) % 360
         self.direction = (np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle)))
 
+class ScriptedPlayer(Player):
+    # plays a fixed list of discrete actions (0-4, as in env_act), one per tick, then idles
+    def __init__(
+            self, init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, actions=(), render=False
+    ):
+        super(ScriptedPlayer, self).__init__(
+            init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, render
+        )
+        self.actions = actions
+        self.tick = 0
+
+    def act(self, obs=None):
+        self.env_act(self.actions[self.tick] if self.tick < len(self.actions) else 0)
+        self.tick += 1
+
 class DQNPlayer(Player):
     def __init__(
-            self, init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, model_path=None, render=False
+            self, init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, model_path=None, render=False,
+            recolor=None, engine=None
     ):
+        # red/blue inverted plane unless another sprite transform is given
+        self.recolor = recolor if recolor is not None else InvertChannels((0, 2))
         super(DQNPlayer, self).__init__(
             init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, render
         )
         self.model_path = model_path
-        self.model1 = DQN.load(self.model_path[0])
-        self.model2 = DQN.load(self.model_path[1])
+        self.engine = engine if engine is not None else model_registry.get_engine(self.model_path)
 
         if render:
             self.set_sprite()
 
+    @property
+    def model1(self):
+        return model_registry.get_model(self.model_path[0])
+
+    @property
+    def model2(self):
+        return model_registry.get_model(self.model_path[1])
+
     def set_sprite(self):
-        self.img = pygame.image.load("assets/plane.png")
-        for x in range(self.img.get_width()):
-            for y in range(self.img.get_height()):
-                curr_color = self.invert_at(x, y)
-                self.img.set_at((x, y), curr_color)
-        self.img.convert_alpha()
-        self.img = pygame.transform.scale(self.img, (50,50))
-        self.img = pygame.transform.rotate(self.img, -90)
-
-    def invert_at(self, x, y):
-        curr_color = self.img.get_at((x, y))
-        curr_color.r = 255-curr_color.r
-        curr_color.b = 255-curr_color.b
-        return curr_color
+        self.img = sprite_cache.get("assets/plane.png", (50,50), rotation=-90, transform=self.recolor)
 
     def act(self, obs=None):
-        if obs[-1] >= 30.0:
-            act_idx, _ = self.model1.predict(obs)
-        else:
-            crt_obs = obs.copy()
-            crt_obs[-1] = 95.0
-            act_idx, _ = self.model2.predict(crt_obs)
-       
-        if act_idx==0:
-            pass
-        elif act_idx==1:
-            self.speed = min(self.interval[1], self.speed + self.speed_delta)
-        elif act_idx==2:
-            self.speed = max(self.interval[0], self.speed - self.speed_delta)
-        elif act_idx==3:
-            self.angle = (self.angle - self.angle_delta) % 360
-        elif act_idx==4:
-            self.angle = (self.angle + self.angle_delta) % 360
-        self.direction = (np.cos(np.deg2rad(self.angle)), np.sin(np.deg2rad(self.angle)))
+        act_idx = self.engine.predict(obs)[0]
+        self.env_act(act_idx)
+
+    @staticmethod
+    def act_batch(players, obs):
+        # one forward pass per shared engine for all AI players of a frame
+        groups = {}
+        for idx, player in enumerate(players):
+            groups.setdefault(id(player.engine), []).append(idx)
+        for idx_list in groups.values():
+            actions = players[idx_list[0]].engine.predict(obs[idx_list])
+            for idx, act_idx in zip(idx_list, actions):
+                players[idx].env_act(act_idx)
+
+
+class RemoteDQNPlayer(DQNPlayer):
+    # DQNPlayer whose models live in a policy_server process; by default it never waits
+    # for a reply and acts on the previous frame's actions (see RemoteEngine)
+    def __init__(
+            self, init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, model_path=None, render=False,
+            recolor=None, socket_path=None, blocking=False
+    ):
+        # the client side only, imported on first use
+        from policy_server import DEFAULT_SOCKET, get_client
+
+        if socket_path is None:
+            socket_path = DEFAULT_SOCKET
+        super(RemoteDQNPlayer, self).__init__(
+            init_pos, init_speed, init_angle, min_speed, max_speed, speed_delta, angle_delta, model_path, render, recolor,
+            engine=get_client(socket_path).engine(model_path, blocking)
+        )
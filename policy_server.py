@@ -0,0 +1,286 @@
+import asyncio
+import os
+import select
+import socket
+import struct
+
+from argparse import ArgumentParser
+from collections import deque
+
+import numpy as np
+
+import model_registry
+from observation import OBS_SIZE
+
+DEFAULT_SOCKET = "/tmp/starpilot_policy.sock"
+
+# request: id, model key length, number of observations, observation size, flags,
+# then the model key (checkpoint paths joined by newlines) and float32 observations.
+# response: id, number of actions, error length, then uint8 actions or the error text
+REQUEST = struct.Struct("<IHHHB")
+RESPONSE = struct.Struct("<IHH")
+DETERMINISTIC = 1
+
+
+class PolicyServer:
+    # serves DQNInference engines over a Unix socket. Every checkpoint pair is loaded
+    # once (through model_registry), and requests for the same engine are micro-batched:
+    # a batch runs `deadline_ms` after its first request arrives, as soon as it holds
+    # `max_batch` observations, or once every connected client has a request in it,
+    # since then nothing else is coming (a game sends one request per frame)
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, deadline_ms=2.0, max_batch=256):
+        self.socket_path = socket_path
+        self.deadline = deadline_ms / 1000
+        self.max_batch = max_batch
+        self.engines = {}
+        self.batches = {}
+        self.batch_rows = {}
+        self.batch_clients = {}
+        self.timers = {}
+        self.connections = 0
+        self.requests = 0
+        self.batches_run = 0
+
+    async def get_engine(self, key):
+        # loading may import SB3/torch, so it runs off the event loop, once per key
+        if key not in self.engines:
+            loop = asyncio.get_running_loop()
+            self.engines[key] = loop.run_in_executor(None, model_registry.get_engine, key.split("\n"))
+        return await self.engines[key]
+
+    async def infer(self, key, obs, deterministic, client=None):
+        engine = await self.get_engine(key)
+        loop = asyncio.get_running_loop()
+        batch_key = (key, deterministic)
+        future = loop.create_future()
+        batch = self.batches.setdefault(batch_key, [])
+        batch.append((obs, future))
+        self.batch_rows[batch_key] = self.batch_rows.get(batch_key, 0) + len(obs)
+        clients = self.batch_clients.setdefault(batch_key, set())
+        clients.add(client)
+        if self.batch_rows[batch_key] >= self.max_batch or len(clients) >= self.connections:
+            self.flush(batch_key, engine)
+        elif len(batch) == 1:
+            self.timers[batch_key] = loop.call_later(self.deadline, self.flush, batch_key, engine)
+        return await future
+
+    def flush(self, batch_key, engine):
+        timer = self.timers.pop(batch_key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.batches.pop(batch_key, None)
+        self.batch_rows.pop(batch_key, None)
+        self.batch_clients.pop(batch_key, None)
+        if not batch:
+            return
+        try:
+            actions = engine.predict(np.concatenate([obs for obs, _ in batch]), deterministic=batch_key[1])
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches_run += 1
+        start = 0
+        for obs, future in batch:
+            future.set_result(actions[start:start + len(obs)])
+            start += len(obs)
+
+    async def respond(self, writer, request_id, key, obs, deterministic):
+        try:
+            actions = await self.infer(key, obs, deterministic, client=id(writer))
+            payload = RESPONSE.pack(request_id, len(actions), 0) + np.asarray(actions, dtype=np.uint8).tobytes()
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}".encode()[:65535]
+            payload = RESPONSE.pack(request_id, 0, len(error)) + error
+        if not writer.is_closing():
+            writer.write(payload)
+
+    async def handle(self, reader, writer):
+        # requests are answered as their batches finish, so a client may pipeline several
+        tasks = set()
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(REQUEST.size)
+                    request_id, key_len, n_obs, obs_size, flags = REQUEST.unpack(header)
+                    key = (await reader.readexactly(key_len)).decode()
+                    data = await reader.readexactly(4 * n_obs * obs_size)
+                except (asyncio.IncompleteReadError, ConnectionResetError):
+                    break
+                obs = np.frombuffer(data, dtype=np.float32).reshape(n_obs, obs_size)
+                self.requests += 1
+                task = asyncio.ensure_future(self.respond(writer, request_id, key, obs, bool(flags & DETERMINISTIC)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, preload=()):
+        for key in preload:
+            await self.get_engine(key)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        print(f"serving on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def model_key(model_path):
+    # absolute paths, so server and clients agree whatever their working directories
+    return "\n".join(os.path.abspath(path) for path in model_path)
+
+
+class PolicyClient:
+    # blocking client for one connection; submit/result allow several requests in flight
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.sock.settimeout(timeout)
+        self.next_id = 0
+        self.results = {}
+        self.buffer = bytearray()
+        self.engines = {}
+
+    def submit(self, model_path, obs, deterministic=False):
+        obs = np.ascontiguousarray(obs, dtype=np.float32).reshape(-1, OBS_SIZE)
+        key = model_key(model_path).encode()
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) % 2 ** 32
+        flags = DETERMINISTIC if deterministic else 0
+        self.sock.sendall(REQUEST.pack(request_id, len(key), len(obs), obs.shape[1], flags) + key + obs.tobytes())
+        return request_id
+
+    def _pump(self, block):
+        if not block and not select.select([self.sock], [], [], 0)[0]:
+            return
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("policy server closed the connection")
+        self.buffer += data
+        while len(self.buffer) >= RESPONSE.size:
+            request_id, n_actions, error_len = RESPONSE.unpack_from(self.buffer)
+            end = RESPONSE.size + (error_len or n_actions)
+            if len(self.buffer) < end:
+                break
+            body = bytes(self.buffer[RESPONSE.size:end])
+            del self.buffer[:end]
+            if error_len:
+                self.results[request_id] = RuntimeError(body.decode())
+            else:
+                self.results[request_id] = np.frombuffer(body, dtype=np.uint8).astype(np.int64)
+
+    def result(self, request_id, block=True):
+        # actions of a submitted request; None if not block and it has not arrived yet
+        while request_id not in self.results:
+            if not block:
+                self._pump(block=False)
+                if request_id not in self.results:
+                    return None
+            else:
+                self._pump(block=True)
+        result = self.results.pop(request_id)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def predict(self, model_path, obs, deterministic=False):
+        return self.result(self.submit(model_path, obs, deterministic))
+
+    def engine(self, model_path, blocking=True):
+        # one engine per model and mode: DQNPlayer.act_batch then sends every player on
+        # this connection in a single request per frame, which the server's batching
+        # (one request per connection before it flushes early) relies on
+        key = (model_key(model_path), blocking)
+        if key not in self.engines:
+            self.engines[key] = RemoteEngine(self, model_path, blocking)
+        return self.engines[key]
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteEngine:
+    # stands in for DQNInference inside DQNPlayer. Blocking, every predict is a round
+    # trip; otherwise this frame's observations are sent and the freshest reply to an
+    # earlier frame is acted on, so the caller never waits (no reply yet means action 0)
+
+    def __init__(self, client, model_path, blocking=True):
+        self.client = client
+        self.model_path = model_path
+        self.blocking = blocking
+        self.pending = deque()
+        self.latest = None
+
+    def predict(self, obs, deterministic=False):
+        obs = np.asarray(obs, dtype=np.float32).reshape(-1, OBS_SIZE)
+        if self.blocking:
+            return self.client.predict(self.model_path, obs, deterministic)
+
+        self.pending.append(self.client.submit(self.model_path, obs, deterministic))
+        while self.pending:
+            actions = self.client.result(self.pending[0], block=False)
+            if actions is None:
+                break
+            self.pending.popleft()
+            self.latest = actions
+        actions, self.latest = self.latest, None
+        if actions is None or len(actions) != len(obs):
+            return np.zeros(len(obs), dtype=np.int64)
+        return actions
+
+
+_clients = {}
+
+
+def get_client(socket_path=DEFAULT_SOCKET):
+    # one connection per socket and process, shared by all remote players
+    if socket_path not in _clients:
+        _clients[socket_path] = PolicyClient(socket_path)
+    return _clients[socket_path]
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument("--deadline-ms", type=float, default=2.0, help="longest a request waits for its batch")
+    parser.add_argument("--max-batch", type=int, default=256, help="observations that trigger a batch right away")
+    parser.add_argument(
+        "--preload",
+        type=str,
+        nargs="*",
+        default=[
+            "weights/rl_model_v1_10000000_steps.zip",
+            "weights/rl_model_v6_10000000_steps.zip"
+        ],
+        help="checkpoint pair (normal, low fuel) to load before accepting clients"
+    )
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+    server = PolicyServer(args.socket, deadline_ms=args.deadline_ms, max_batch=args.max_batch)
+    preload = [model_key(args.preload)] if args.preload else []
+    try:
+        asyncio.run(server.serve(preload))
+    except KeyboardInterrupt:
+        pass
+    print(f"{server.requests} requests in {server.batches_run} batches")
+
+
+if __name__ == "__main__":
+    main()
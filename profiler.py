@@ -0,0 +1,167 @@
+import json
+import os
+
+from time import perf_counter_ns
+
+import numpy as np
+
+
+class NullProfiler:
+    # stand-in when profiling is off, so call sites need no checks
+
+    enabled = False
+
+    def start_frame(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def end_frame(self):
+        pass
+
+    def draw(self, screen, font):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    # lap timers: lap(name) charges the time since the previous lap (or frame start)
+    # to `name`, so interleaved phases of one frame accumulate into their own totals.
+    # The last `history` frames are kept per phase; frame times also go to a histogram
+
+    enabled = True
+
+    def __init__(self, budget_ms=None, history=600, bin_ms=0.5, max_ms=100.0, overlay_every=30):
+        self.budget_ms = budget_ms
+        self.history = history
+        self.bin_ms = bin_ms
+        self.overlay_every = overlay_every
+
+        self.phase_idx = {}
+        self.names = []
+        self.current = []
+        self.frame_times = np.zeros(history, dtype=np.int64)
+        self.phase_times = np.zeros((history, 8), dtype=np.int64)
+        self.totals = np.zeros(8, dtype=np.int64)
+        self.histogram = np.zeros(int(np.ceil(max_ms / bin_ms)) + 1, dtype=np.int64)
+        self.frames = 0
+        self.over_budget = 0
+        self.total_ns = 0
+
+        self.overlay = []
+        self.frame_start = self.last = perf_counter_ns()
+
+    def _register(self, name):
+        idx = len(self.names)
+        self.phase_idx[name] = idx
+        self.names.append(name)
+        self.current.append(0)
+        if idx >= self.phase_times.shape[1]:
+            self.phase_times = np.concatenate([self.phase_times, np.zeros_like(self.phase_times)], axis=1)
+            self.totals = np.concatenate([self.totals, np.zeros_like(self.totals)])
+        return idx
+
+    def start_frame(self):
+        self.frame_start = self.last = perf_counter_ns()
+
+    def lap(self, name):
+        now = perf_counter_ns()
+        idx = self.phase_idx.get(name)
+        if idx is None:
+            idx = self._register(name)
+        self.current[idx] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        now = perf_counter_ns()
+        frame_ns = now - self.frame_start
+        slot = self.frames % self.history
+        n_phases = len(self.current)
+        self.frame_times[slot] = frame_ns
+        self.phase_times[slot, :n_phases] = self.current
+        self.totals[:n_phases] += self.phase_times[slot, :n_phases]
+        self.current = [0] * n_phases
+
+        frame_ms = frame_ns / 1e6
+        self.histogram[min(int(frame_ms / self.bin_ms), len(self.histogram) - 1)] += 1
+        if self.budget_ms is not None and frame_ms > self.budget_ms:
+            self.over_budget += 1
+        self.total_ns += frame_ns
+        self.frames += 1
+        self.frame_start = self.last = now
+
+    def summary(self):
+        if self.frames == 0:
+            return {"frames": 0}
+        recent = min(self.frames, self.history)
+        frame_ms = self.frame_times[:recent] / 1e6
+        phases = {}
+        for name, idx in self.phase_idx.items():
+            window = self.phase_times[:recent, idx] / 1e6
+            phases[name] = {
+                "mean_ms": float(self.totals[idx] / self.frames / 1e6),
+                "p50_ms": float(np.percentile(window, 50)),
+                "p99_ms": float(np.percentile(window, 99)),
+                "max_ms": float(window.max()),
+                "share": float(self.totals[idx] / self.total_ns) if self.total_ns else 0.0,
+            }
+        return {
+            "frames": self.frames,
+            "budget_ms": self.budget_ms,
+            "over_budget": self.over_budget,
+            "frame": {
+                "mean_ms": float(self.total_ns / self.frames / 1e6),
+                "p50_ms": float(np.percentile(frame_ms, 50)),
+                "p99_ms": float(np.percentile(frame_ms, 99)),
+                "max_ms": float(frame_ms.max()),
+            },
+            "phases": phases,
+            "histogram": {
+                "bin_ms": self.bin_ms,
+                # the last bin collects everything slower
+                "counts": self.histogram.tolist(),
+            },
+        }
+
+    def export(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as fout:
+            json.dump(self.summary(), fout, indent=2)
+
+    def report(self):
+        summary = self.summary()
+        if summary["frames"] == 0:
+            return "no frames profiled"
+        frame = summary["frame"]
+        lines = [
+            f"{summary['frames']} frames, mean {frame['mean_ms']:.2f} ms, p99 {frame['p99_ms']:.2f} ms, "
+            f"max {frame['max_ms']:.2f} ms"
+        ]
+        if self.budget_ms is not None:
+            lines[0] += f", {summary['over_budget']} over the {self.budget_ms:.1f} ms budget"
+        for name, stats in sorted(summary["phases"].items(), key=lambda item: -item[1]["mean_ms"]):
+            lines.append(
+                f"  {name:12s} {stats['mean_ms']:7.3f} ms  p99 {stats['p99_ms']:7.3f} ms  {100 * stats['share']:5.1f}%"
+            )
+        return "\n".join(lines)
+
+    def draw(self, screen, font):
+        # per-phase means of the recent frames; the text is re-rendered every `overlay_every` frames
+        if self.frames % self.overlay_every == 0 or not self.overlay:
+            recent = min(self.frames, self.history)
+            lines = []
+            if recent:
+                frame_ms = self.frame_times[:recent].mean() / 1e6
+                lines.append(f"frame {frame_ms:5.2f} ms")
+                for name, idx in self.phase_idx.items():
+                    lines.append(f"{name} {self.phase_times[:recent, idx].mean() / 1e6:5.2f}")
+            self.overlay = [font.render(line, True, (255, 255, 255), (0, 0, 0)) for line in lines]
+        # returns the area drawn on, None when empty
+        rects = [
+            screen.blit(text, (screen.get_width() - text.get_width() - 10, 120 + 22 * idx))
+            for idx, text in enumerate(self.overlay)
+        ]
+        return rects[0].unionall(rects[1:]) if rects else None
@@ -0,0 +1,335 @@
+import json
+import struct
+
+from argparse import ArgumentParser
+
+import numpy as np
+
+# file layout: MAGIC, uint32 header length, JSON header, then chunks. A chunk is
+# CHUNK_MAGIC, uint32 row count, and one contiguous block per column (in header
+# order), every block starting on an ALIGN boundary so readers can view it in place
+MAGIC = b"SPTRAJ01"
+CHUNK_MAGIC = b"CHNK"
+ALIGN = 64
+
+
+def _pad(offset):
+    return -offset % ALIGN
+
+
+def columns(n_players=1):
+    # (name, dtype, per-row shape); per-player fields have a leading n_players axis
+    return [
+        ("episode", "<i4", ()),
+        ("step", "<i4", ()),
+        ("time", "<f4", ()),
+        ("pos", "<f4", (n_players, 2)),
+        ("angle", "<f4", (n_players,)),
+        ("speed", "<f4", (n_players,)),
+        ("fuel", "<f4", (n_players,)),
+        ("score", "<i4", (n_players,)),
+        ("action", "<i1", (n_players,)),
+        ("reward", "<f4", (n_players,)),
+        ("target_pos", "<f4", (2,)),
+        ("pickup_pos", "<f4", (2,)),
+        ("done", "u1", ()),
+        ("truncated", "u1", ()),
+    ]
+
+
+def snapshot(players, bars, targets, pickups):
+    # the state half of a row, read off live game objects
+    return {
+        "pos": [player.pos for player in players],
+        "angle": [player.angle for player in players],
+        "speed": [player.speed for player in players],
+        "fuel": [bar.value for bar in bars],
+        "score": [player.score for player in players],
+        "target_pos": targets[0].pos,
+        "pickup_pos": pickups[0].pos,
+    }
+
+
+class TrajectoryWriter:
+    # buffers rows in preallocated column arrays and appends them to disk every `chunk_size` rows
+
+    def __init__(self, path, n_players=1, chunk_size=1024, meta=None):
+        self.path = path
+        self.n_players = n_players
+        self.chunk_size = chunk_size
+        self.columns = columns(n_players)
+        self.buffers = {
+            name: np.zeros((chunk_size, *shape), dtype=dtype) for name, dtype, shape in self.columns
+        }
+        self.n_buffered = 0
+        self.n_rows = 0
+
+        header = json.dumps({
+            "columns": [[name, dtype, list(shape)] for name, dtype, shape in self.columns],
+            "n_players": n_players,
+            "meta": meta or {},
+        }).encode()
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.write(b"\0" * _pad(self.file.tell()))
+
+    def append(self, **row):
+        idx = self.n_buffered
+        for name, value in row.items():
+            self.buffers[name][idx] = value
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk_size:
+            self.flush()
+
+    def extend(self, rows):
+        # a block of rows as {column: array}, written in order after the rows so far
+        n_rows = len(next(iter(rows.values())))
+        done = 0
+        while done < n_rows:
+            take = min(self.chunk_size - self.n_buffered, n_rows - done)
+            for name, values in rows.items():
+                self.buffers[name][self.n_buffered:self.n_buffered + take] = values[done:done + take]
+            self.n_buffered += take
+            done += take
+            if self.n_buffered == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        n_rows = self.n_buffered
+        if n_rows == 0:
+            return
+        self.file.write(CHUNK_MAGIC + struct.pack("<I", n_rows))
+        self.file.write(b"\0" * _pad(self.file.tell()))
+        for name, _, _ in self.columns:
+            self.file.write(self.buffers[name][:n_rows].tobytes())
+            self.file.write(b"\0" * _pad(self.file.tell()))
+            self.buffers[name][:n_rows] = 0
+        self.file.flush()
+        self.n_rows += n_rows
+        self.n_buffered = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EpisodeBuffer:
+    # the rows of one episode held in memory, for episodes played side by side: each is
+    # handed to the shared TrajectoryWriter in one piece when it ends, so rows of one
+    # episode stay contiguous in the file
+
+    def __init__(self, n_players=1, capacity=1024):
+        self.columns = columns(n_players)
+        self.buffers = {
+            name: np.zeros((capacity, *shape), dtype=dtype) for name, dtype, shape in self.columns
+        }
+        self.n_rows = 0
+
+    def append(self, **row):
+        if self.n_rows == len(self.buffers["episode"]):
+            for name, values in self.buffers.items():
+                grown = np.zeros((2 * len(values), *values.shape[1:]), dtype=values.dtype)
+                grown[:len(values)] = values
+                self.buffers[name] = grown
+        for name, value in row.items():
+            self.buffers[name][self.n_rows] = value
+        self.n_rows += 1
+
+    def write_to(self, writer):
+        if self.n_rows:
+            writer.extend({name: values[:self.n_rows] for name, values in self.buffers.items()})
+        self.n_rows = 0
+
+
+class TrajectoryReader:
+    # memory-maps a recording; rows are served as views into the file, so only the
+    # pages actually touched are read. A partially written trailing chunk is ignored
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a trajectory recording")
+        offset = len(MAGIC)
+        (header_len,) = struct.unpack("<I", bytes(self.data[offset:offset + 4]))
+        offset += 4
+        header = json.loads(bytes(self.data[offset:offset + header_len]))
+        offset += header_len
+        offset += _pad(offset)
+
+        self.n_players = header["n_players"]
+        self.meta = header["meta"]
+        self.columns = [(name, np.dtype(dtype), tuple(shape)) for name, dtype, shape in header["columns"]]
+
+        self.chunks = []
+        starts = [0]
+        while offset + 8 <= len(self.data):
+            if bytes(self.data[offset:offset + 4]) != CHUNK_MAGIC:
+                break
+            (n_rows,) = struct.unpack("<I", bytes(self.data[offset + 4:offset + 8]))
+            offset += 8
+            offset += _pad(offset)
+            chunk = {}
+            for name, dtype, shape in self.columns:
+                size = n_rows * dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+                if offset + size > len(self.data):
+                    break
+                chunk[name] = self.data[offset:offset + size].view(dtype).reshape(n_rows, *shape)
+                offset += size
+                offset += _pad(offset)
+            if len(chunk) < len(self.columns):
+                break
+            self.chunks.append(chunk)
+            starts.append(starts[-1] + n_rows)
+        self.starts = np.array(starts, dtype=np.int64)
+        self.sprites = None
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def locate(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        chunk_idx = int(np.searchsorted(self.starts, idx, side="right")) - 1
+        return chunk_idx, idx - int(self.starts[chunk_idx])
+
+    def __getitem__(self, idx):
+        # one row as a dict of views
+        chunk_idx, row = self.locate(idx)
+        return {name: values[row] for name, values in self.chunks[chunk_idx].items()}
+
+    def column(self, name, start=0, stop=None):
+        # rows [start, stop) of one column; a view when they fall in a single chunk
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            _, dtype, shape = next(col for col in self.columns if col[0] == name)
+            return np.zeros((0, *shape), dtype=dtype)
+        first, first_row = self.locate(start)
+        last, last_row = self.locate(stop - 1)
+        if first == last:
+            return self.chunks[first][name][first_row:last_row + 1]
+        parts = [self.chunks[first][name][first_row:]]
+        parts.extend(self.chunks[idx][name] for idx in range(first + 1, last))
+        parts.append(self.chunks[last][name][:last_row + 1])
+        return np.concatenate(parts)
+
+    def iter_chunks(self):
+        # dicts of column views, one per chunk, for streaming over the whole file
+        return iter(self.chunks)
+
+    def episodes(self):
+        # (start, stop) row ranges of each recorded episode, scanning only the episode column
+        bounds = []
+        start = 0
+        previous = None
+        for chunk_start, chunk in zip(self.starts, self.chunks):
+            episode = chunk["episode"]
+            for row in np.flatnonzero(np.diff(episode, prepend=episode[0] if previous is None else previous)):
+                bounds.append((start, int(chunk_start) + int(row)))
+                start = int(chunk_start) + int(row)
+            previous = episode[-1]
+        if len(self) > start:
+            bounds.append((start, len(self)))
+        return bounds
+
+    def render(self, idx, screen, font=None):
+        # draws row idx with the game's own sprites
+        if self.sprites is None:
+            self.sprites = ReplaySprites(self.n_players)
+        self.sprites.draw(screen, self[idx], font)
+
+    def replay(self, screen, start=0, stop=None, fps=60, font=None):
+        # shows rows [start, stop) and returns the first row not shown, to resume from
+        import pygame
+
+        stop = len(self) if stop is None else min(stop, len(self))
+        clock = pygame.time.Clock()
+        for idx in range(start, stop):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return idx
+            self.render(idx, screen, font)
+            pygame.display.update()
+            clock.tick(fps)
+        return max(start, stop)
+
+
+class ReplaySprites:
+    # game objects reused for every replayed frame, only their state is overwritten
+
+    def __init__(self, n_players):
+        from pickup import ReplenishFuel
+        from player import Player
+        from sprites import InvertChannels, sprite_cache
+        from status import StatusBar
+        from target import Target
+
+        self.players = [Player([0.0, 0.0], 1, 0, 1, 10, 0.2, 5, render=True) for _ in range(n_players)]
+        self.bars = [StatusBar()]
+        if n_players > 1:
+            # game.main layout: the AI is player 0, drawn recolored, with the second bar for the human
+            self.players[0].img = sprite_cache.get("assets/plane.png", (50,50), rotation=-90, transform=InvertChannels((0, 2)))
+            self.bars.append(StatusBar(topleft=(500, 70), color=(214, 15, 58)))
+        self.target = Target(np.zeros(2), (80, 80), render=True)
+        self.pickup = ReplenishFuel(np.zeros(2), (80, 80), render=True)
+
+    def draw(self, screen, row, font=None):
+        screen.fill((118, 170, 176))
+        for idx, (player, bar) in enumerate(zip(self.players, self.bars)):
+            player.pos = row["pos"][idx].tolist()
+            player.angle = float(row["angle"][idx])
+            player.draw(screen)
+            bar.value = float(row["fuel"][idx])
+            bar.draw(screen)
+        self.target.pos = row["target_pos"].tolist()
+        self.target.draw(screen)
+        self.pickup.pos = row["pickup_pos"].tolist()
+        self.pickup.draw(screen)
+        if font is not None:
+            for idx, (score, bar) in enumerate(zip(row["score"], self.bars)):
+                text = font.render(f"Score: {score}", True, bar.color if len(self.bars) > 1 else (255, 255, 255))
+                screen.blit(text, (10, 20 + 30 * idx))
+
+
+def parse_args():
+
+    parser = ArgumentParser()
+    parser.add_argument("command", choices=["info", "replay"])
+    parser.add_argument("path", type=str)
+    parser.add_argument("--start", type=int, default=0, help="first row to replay")
+    parser.add_argument("--fps", type=int, default=60)
+
+    return parser.parse_args()
+
+
+def main():
+
+    args = parse_args()
+    reader = TrajectoryReader(args.path)
+    if args.command == "info":
+        episodes = reader.episodes()
+        print(f"{len(reader)} rows in {len(reader.chunks)} chunks, {len(episodes)} episodes, {reader.n_players} player(s)")
+        print(f"meta: {reader.meta}")
+        return
+
+    import pygame
+
+    pygame.init()
+    pygame.font.init()
+    font = pygame.font.Font('freesansbold.ttf', 20)
+    screen = pygame.display.set_mode((800, 800))
+    reader.replay(screen, start=args.start, fps=args.fps, font=font)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import pygame
+
+
+class DirtyRenderer:
+    # redraws only what changed since the previous frame. Every frame the caller adds its
+    # layers back to front, each with a unique key, the screen rect it covers and a token
+    # that changes whenever its pixels would (the blitted surface, a bar's fill width...).
+    # render() restores the background under every layer that moved, changed or went away,
+    # redraws the layers overlapping those areas clipped to them, and returns just those
+    # rects for pygame.display.update
+
+    def __init__(self, screen, color=(118, 170, 176)):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size())
+        self.background.fill(color)
+        if pygame.display.get_surface() is not None:
+            self.background = self.background.convert()
+        self.items = []
+        self.drawn = {}
+        self.marked = []
+        self.texts = {}
+        self.full = True
+
+    def add(self, key, rect, token, draw, *args):
+        self.items.append((key, pygame.Rect(rect), token, draw, args))
+
+    def blit(self, key, surface, dest, special_flags=0):
+        rect = pygame.Rect(dest[0], dest[1], *surface.get_size())
+        self.add(key, rect, (surface, special_flags), self.screen.blit, surface, rect, None, special_flags)
+
+    def text(self, key, font, text, color, **placement):
+        # font.render only runs when the text of this key changes; placement as in get_rect
+        cached = self.texts.get(key)
+        if cached is None or cached[0] != (font, text, color):
+            cached = (font, text, color), font.render(text, True, color)
+            self.texts[key] = cached
+        surface = cached[1]
+        self.blit(key, surface, surface.get_rect(**placement).topleft)
+
+    def mark(self, rect):
+        # something drawn straight onto the screen after render(); cleaned up next frame
+        self.marked.append(pygame.Rect(rect))
+
+    def invalidate(self):
+        # the next render() redraws and updates the whole screen
+        self.full = True
+
+    def render(self):
+        items = self.items
+        self.items = []
+        drawn = {key: (rect, token) for key, rect, token, _, _ in items}
+
+        if self.full:
+            self.screen.blit(self.background, (0, 0))
+            for _, _, _, draw, args in items:
+                draw(*args)
+            dirty = [self.screen.get_rect()]
+            self.full = False
+        else:
+            changed = self.marked
+            for key, (rect, token) in drawn.items():
+                old = self.drawn.pop(key, None)
+                if old is None:
+                    changed.append(rect)
+                elif old != (rect, token):
+                    # a sprite that moved a little is one area, not two overlapping ones
+                    changed.extend([old[0].union(rect)] if old[0].colliderect(rect) else [old[0], rect])
+            # layers that were not drawn this frame
+            changed.extend(rect for rect, _ in self.drawn.values())
+
+            screen_rect = self.screen.get_rect()
+            dirty = [area for area in (rect.clip(screen_rect) for rect in changed) if area.w and area.h]
+            # areas are handled one by one, so where they overlap the last pass wins
+            # and alpha-blended layers are never blended twice onto the same pixels
+            for area in dirty:
+                self.screen.set_clip(area)
+                self.screen.blit(self.background, area, area)
+                for _, rect, _, draw, args in items:
+                    if rect.colliderect(area):
+                        draw(*args)
+            self.screen.set_clip(None)
+
+        self.marked = []
+        self.drawn = drawn
+        return dirty
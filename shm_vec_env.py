@@ -0,0 +1,139 @@
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from env_worker import CloudpickleWrapper, shm_worker
+
+
+class ShmSubprocVecEnv(VecEnv):
+
+    def __init__(self, env_fns, start_method=None) -> None:
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        if start_method == "forkserver":
+            # imported once in the fork server, so every forked worker starts with the env loaded
+            ctx.set_forkserver_preload(["__main__", "env_worker", "gym_env"])
+
+        # build one env in the parent just to read the spaces
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        obs_shape = (n_envs, *observation_space.shape)
+        obs_size = int(np.prod(obs_shape))
+        self._shm = {
+            "obs": ctx.RawArray("f", obs_size),
+            "terminal_obs": ctx.RawArray("f", obs_size),
+            "rews": ctx.RawArray("f", n_envs),
+            "dones": ctx.RawArray("B", n_envs),
+            "actions": ctx.RawArray("q", n_envs),
+            "steps": ctx.RawArray("q", n_envs),
+            "busy": ctx.RawArray("d", n_envs),
+        }
+        self.buf_obs = np.frombuffer(self._shm["obs"], dtype=np.float32).reshape(obs_shape)
+        self.buf_terminal_obs = np.frombuffer(self._shm["terminal_obs"], dtype=np.float32).reshape(obs_shape)
+        self.buf_rews = np.frombuffer(self._shm["rews"], dtype=np.float32)
+        self.buf_dones = np.frombuffer(self._shm["dones"], dtype=np.uint8)
+        self.buf_actions = np.frombuffer(self._shm["actions"], dtype=np.int64)
+        self.worker_steps = np.frombuffer(self._shm["steps"], dtype=np.int64)
+        self.worker_busy = np.frombuffer(self._shm["busy"], dtype=np.float64)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for idx, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), idx, self._shm, obs_shape)
+            process = ctx.Process(target=shm_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.start_time = time.perf_counter()
+        super(ShmSubprocVecEnv, self).__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions):
+        self.buf_actions[:] = np.asarray(actions).reshape(self.num_envs)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        dones = self.buf_dones.astype(bool)
+        for env_idx in np.flatnonzero(dones):
+            infos[env_idx]["terminal_observation"] = self.buf_terminal_obs[env_idx].copy()
+        return self.buf_obs.copy(), self.buf_rews.copy(), dones, infos
+
+    def reset(self):
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", self._seeds[env_idx]))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf_obs.copy()
+
+    def steps_per_sec(self):
+        # per-worker throughput, measured over the time spent inside env.step
+        return self.worker_steps / np.maximum(self.worker_busy, 1e-9)
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        # workers run bare GameEnvs; answering here also keeps the wrapper class (and
+        # with it stable_baselines3 and torch) from being unpickled in every worker
+        return [False for _ in self._get_indices(indices)]
+
+    def _get_target_remotes(self, indices):
+        return [self.remotes[i] for i in self._get_indices(indices)]
+
+
+class WorkerThroughputCallback(BaseCallback):
+
+    def __init__(self, log_freq=10000, verbose=0):
+        super(WorkerThroughputCallback, self).__init__(verbose)
+        self.log_freq = log_freq
+
+    def _on_step(self):
+        if self.n_calls % self.log_freq == 0:
+            env = self.training_env.unwrapped
+            for idx, steps_per_sec in enumerate(env.steps_per_sec()):
+                self.logger.record(f"workers/env_steps_per_sec_{idx}", float(steps_per_sec))
+        return True
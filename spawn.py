@@ -0,0 +1,91 @@
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+# SpawnQueue.get_state: packed PCG64 state (state, inc as hi/lo words, has_uint32, uinteger), cursor
+STATE_SIZE = 7
+
+
+def pack_pcg64(state, out):
+    inner = state["state"]
+    out[0] = inner["state"] >> 64
+    out[1] = inner["state"] & MASK64
+    out[2] = inner["inc"] >> 64
+    out[3] = inner["inc"] & MASK64
+    out[4] = state["has_uint32"]
+    out[5] = state["uinteger"]
+    return out
+
+
+def unpack_pcg64(packed):
+    words = [int(word) for word in packed[:6]]
+    return {
+        "bit_generator": "PCG64",
+        "state": {"state": (words[0] << 64) | words[1], "inc": (words[2] << 64) | words[3]},
+        "has_uint32": words[4],
+        "uinteger": words[5],
+    }
+
+
+class SpawnQueue:
+    # respawn positions pre-drawn in batches of `batch_size`, one independent
+    # Generator stream per environment; a stream is only refilled once it runs dry
+
+    def __init__(self, rngs, low=100, high=700, batch_size=64):
+        self.rngs = list(rngs)
+        self.low = low
+        self.high = high
+        self.batch_size = batch_size
+        self.buffer = np.zeros((len(self.rngs), batch_size, 2), dtype=np.int64)
+        self.cursor = np.full(len(self.rngs), batch_size, dtype=np.int64)
+        # generator state each current batch was drawn from; the generator only advances
+        # when a batch is drawn, so this plus the cursor pins the whole future stream
+        self.drawn_from = np.zeros((len(self.rngs), 6), dtype=np.uint64)
+        self.has_batch = np.zeros(len(self.rngs), dtype=bool)
+
+    @classmethod
+    def from_seed(cls, seed=None, n=1, **kwargs):
+        # SeedSequence.spawn keeps the n streams statistically independent
+        children = np.random.SeedSequence(seed).spawn(n)
+        return cls([np.random.default_rng(child) for child in children], **kwargs)
+
+    def take(self, env_idx):
+        # one position per entry of env_idx (entries must be distinct), shape (len(env_idx), 2)
+        env_idx = np.asarray(env_idx, dtype=np.int64)
+        for idx in env_idx[self.cursor[env_idx] >= self.batch_size]:
+            self._draw(idx)
+            self.cursor[idx] = 0
+        positions = self.buffer[env_idx, self.cursor[env_idx]]
+        self.cursor[env_idx] += 1
+        return positions
+
+    def next(self, env_idx=0):
+        return self.take([env_idx])[0]
+
+    def _draw(self, idx):
+        pack_pcg64(self.rngs[idx].bit_generator.state, self.drawn_from[idx])
+        self.has_batch[idx] = True
+        self.buffer[idx] = self.rngs[idx].integers(self.low, self.high, size=(self.batch_size, 2))
+
+    def get_state(self, env_idx=0, out=None):
+        # (STATE_SIZE,) uint64; restoring it replays exactly the positions that would have followed
+        if out is None:
+            out = np.empty(STATE_SIZE, dtype=np.uint64)
+        cursor = self.cursor[env_idx]
+        if cursor < self.batch_size:
+            out[:6] = self.drawn_from[env_idx]
+        else:
+            pack_pcg64(self.rngs[env_idx].bit_generator.state, out)
+        out[6] = cursor
+        return out
+
+    def set_state(self, state, env_idx=0):
+        cursor = int(state[6])
+        if cursor < self.batch_size:
+            # the batch is only redrawn when it is not the one already buffered
+            if not (self.has_batch[env_idx] and np.array_equal(self.drawn_from[env_idx], state[:6])):
+                self.rngs[env_idx].bit_generator.state = unpack_pcg64(state)
+                self._draw(env_idx)
+        else:
+            self.rngs[env_idx].bit_generator.state = unpack_pcg64(state)
+            self.has_batch[env_idx] = False
+        self.cursor[env_idx] = cursor
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+
+class InvertChannels:
+    # 255 - value on the given RGB channels, e.g. (0, 2) swaps the plane from blue to red
+
+    def __init__(self, channels=(0, 2)):
+        self.channels = tuple(channels)
+        self.key = ("invert", self.channels)
+
+    def __call__(self, rgb):
+        for channel in self.channels:
+            np.subtract(255, rgb[:, :, channel], out=rgb[:, :, channel])
+
+
+class Tint:
+    # blends every pixel towards `color` by `strength` in [0, 1]
+
+    def __init__(self, color, strength=0.5):
+        self.color = tuple(int(c) for c in color)
+        self.strength = float(strength)
+        self.key = ("tint", self.color, self.strength)
+
+    def __call__(self, rgb):
+        blended = rgb * (1 - self.strength) + np.array(self.color, dtype=np.float32) * self.strength
+        np.copyto(rgb, np.rint(blended), casting="unsafe")
+
+
+class Palette:
+    # exact color replacement, {(r, g, b): (r, g, b)}; colors not in the mapping are kept
+
+    def __init__(self, mapping):
+        self.mapping = tuple(sorted((tuple(src), tuple(dst)) for src, dst in mapping.items()))
+        self.key = ("palette", self.mapping)
+        self.src = np.array([_pack(src) for src, _ in self.mapping], dtype=np.uint32)
+        self.dst = np.array([dst for _, dst in self.mapping], dtype=np.uint8).reshape(-1, 3)
+
+    def __call__(self, rgb):
+        codes = _pack(rgb)
+        idx = np.minimum(np.searchsorted(self.src, codes), len(self.src) - 1)
+        hit = self.src[idx] == codes
+        rgb[hit] = self.dst[idx[hit]]
+
+
+def _pack(rgb):
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def recolor(img, transform):
+    # applies `transform` to the RGB channels of a copy of `img` in one array pass; alpha is kept
+    img = img.copy()
+    rgb = pygame.surfarray.pixels3d(img)
+    transform(rgb)
+    del rgb
+    return img
+
+
+class SpriteCache:
+    # decodes, recolors and scales every asset once; rotated copies are cached per
+    # (sprite, angle) and evicted least-recently-used beyond `max_rotations`
+
+    def __init__(self, max_rotations=1024, granularity=5):
+        self.max_rotations = max_rotations
+        self.granularity = granularity
+        self.images = {}
+        self.rotations = OrderedDict()
+
+    def get(self, path, size=None, rotation=0, transform=None):
+        key = (path, size, rotation, None if transform is None else transform.key)
+        img = self.images.get(key)
+        if img is None:
+            img = pygame.image.load(path)
+            if transform is not None:
+                img = recolor(img, transform)
+            if size is not None:
+                img = pygame.transform.scale(img, size)
+            if rotation:
+                img = pygame.transform.rotate(img, rotation)
+            self.images[key] = img
+        return img
+
+    def rotate(self, img, angle):
+        # angles are multiples of angle_delta, anything finer is snapped to the grid
+        angle = round(angle / self.granularity) * self.granularity
+        key = (id(img), angle)
+        entry = self.rotations.get(key)
+        if entry is not None and entry[0] is img:
+            self.rotations.move_to_end(key)
+            return entry[1]
+
+        rotated = pygame.transform.rotate(img, angle)
+        self.rotations[key] = (img, rotated)
+        if len(self.rotations) > self.max_rotations:
+            self.rotations.popitem(last=False)
+        return rotated
+
+    def precompute(self, img):
+        for angle in range(0, 360, self.granularity):
+            self.rotate(img, angle)
+
+    def clear(self):
+        self.images.clear()
+        self.rotations.clear()
+
+
+sprite_cache = SpriteCache()
@@ -8,13 +8,22 @@ class StatusBar:
         self.value = value
         self.max_value = max_value
         self.color = color
+        self.surface = None
+        self.surface_width = None
     
     def update(self, delta):
         self.value = max(0, min(self.max_value, self.value + delta))
 
+    def sprite(self):
+        # (surface, topleft) of the bar, redrawn only when its filled width in whole pixels
+        # changes; a plain blit also clips cleanly, unlike a thick draw.rect border
+        width = int(self.img.w * (self.value/self.max_value))
+        if width != self.surface_width:
+            self.surface = pygame.Surface(self.img.size, pygame.SRCALPHA)
+            pygame.draw.rect(self.surface, self.color, pygame.Rect((0, 0), (width, self.img.h)), width=0)
+            pygame.draw.rect(self.surface, (0, 0, 0), self.surface.get_rect(), width=5)
+            self.surface_width = width
+        return self.surface, self.img.topleft
+
     def draw(self, screen):
-        ratio = self.img.w * (self.value/self.max_value)
-        scaled = pygame.Rect(self.img.topleft, (ratio, self.img.h))
-        pygame.draw.rect(screen, self.color, scaled, width=0)
-        pygame.draw.rect(screen, (0, 0, 0), self.img, width=5)
-        
\ No newline at end of file
+        screen.blit(*self.sprite())
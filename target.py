@@ -1,25 +1,28 @@
-import pygame
+from entities import Entity
+from sprites import sprite_cache
 
-class Target:
+class Target(Entity):
 
-    def __init__(self, pos, size, img_path="assets/star.png", render=False):
-        self.pos = pos
-        self.size = size
+    __slots__ = ("img_path",)
+    kind = 0
+
+    def __init__(self, pos, size, img_path="assets/star.png", render=False, store=None):
+        super(Target, self).__init__(pos, size, store)
         self.img_path = img_path
-        
+
         if render:
             self.set_sprite()
 
+    @property
+    def img(self):
+        return sprite_cache.get(self.img_path, self.size)
+
     def set_sprite(self):
-        self.img = pygame.image.load(self.img_path)
-        self.img.convert_alpha()
-        self.img = pygame.transform.scale(self.img, self.size)
+        # decodes and scales the sprite into the shared cache ahead of the first draw
+        self.img
+
+    def sprite(self):
+        return self.img, (self.pos[0] - int(self.size[0]/2), self.pos[1] - int(self.size[1]/2))
 
     def draw(self, screen):
-        screen.blit(
-            self.img,
-            (
-                self.pos[0] - int(self.size[0]/2),
-                self.pos[1] - int(self.size[1]/2)
-            )    
-        )
\ No newline at end of file
+        screen.blit(*self.sprite())
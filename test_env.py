@@ -6,7 +6,7 @@ from gym_env import GameEnv
 def main():
 
     env = GameEnv("configs/game_config.yml")
-    obs = env.reset()
+    obs, _ = env.reset()
 
     print("Initial obs:")
     print(obs)    
@@ -25,11 +25,11 @@ def main():
     for step in range(n_steps):
         action = np.random.choice(5)
         print("Step {}".format(step + 1))
-        obs, reward, done, _ = env.step(action)
+        obs, reward, done, truncated, _ = env.step(action)
         s += reward
-        print("obs=", obs, "reward=", reward, "done=", done)
+        print("obs=", obs, "reward=", reward, "done=", done, "truncated=", truncated)
         # env.render()
-        if done:
+        if done or truncated:
             print("Done!", "reward=", s)
             break
 
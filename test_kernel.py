@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from gym_env import GameEnv
+from kernel import STATE_SIZE, jit_kernel, make_params, run_block_python
+
+
+def random_block(rng):
+    state = np.empty(STATE_SIZE, dtype=np.float64)
+    state[:2] = rng.uniform(0, 800, size=2)
+    state[2] = rng.uniform(1, 10)
+    state[3] = 5.0 * rng.integers(0, 72)
+    state[4:6] = np.cos(np.deg2rad(state[3])), np.sin(np.deg2rad(state[3]))
+    state[6] = rng.uniform(0, 100)
+    state[7] = rng.uniform(295, 300) if rng.random() < 0.1 else rng.uniform(0, 300)
+    state[8] = 0.0
+    n_targets = int(rng.integers(1, 4))
+    centers = rng.integers(100, 700, size=(n_targets + int(rng.integers(1, 4)), 2)).astype(np.float64)
+    radii = np.full(len(centers), 40.0)
+    physics_ticks = int(rng.integers(1, 5))
+    n_ticks = 5 * physics_ticks
+    return state, int(rng.integers(5)), int(rng.integers(n_ticks)), n_ticks, physics_ticks, centers, radii, n_targets
+
+
+def test_jit_matches_python(n_blocks=20000, seed=0):
+    # the compiled kernel and the interpreted fallback agree bit for bit
+    pytest.importorskip("numba")
+    run_block_jit = jit_kernel()
+    rng = np.random.default_rng(seed)
+    params = make_params((800, 800), 60, 1, 10, 0.2, 5, 300)
+    mismatches = 0
+    for _ in range(n_blocks):
+        state, action, start, n_ticks, physics_ticks, centers, radii, n_targets = random_block(rng)
+        outputs = []
+        for kernel in (run_block_python, run_block_jit):
+            block_state = state.copy()
+            hits = np.zeros(len(radii), dtype=np.int8)
+            tick, flags = kernel(block_state, action, start, n_ticks, physics_ticks, centers, radii, n_targets, params, hits)
+            outputs.append((block_state.tobytes(), hits.tobytes(), int(tick), int(flags)))
+        mismatches += outputs[0] != outputs[1]
+    assert mismatches == 0, f"{mismatches} of {n_blocks} blocks differ between the numba and interpreted kernels"
+
+
+def rollout(kernel, physics_ticks, n_steps=6000, seed=2):
+    env = GameEnv("configs/game_config.yml")
+    env.physics_ticks = physics_ticks
+    env.kernel = kernel
+    actions = np.random.default_rng(seed).integers(5, size=n_steps)
+    env.reset(seed=seed)
+    rows = []
+    for action in actions:
+        obs, reward, done, truncated, _ = env.step(action)
+        rows.append((obs, reward, env.player.score, done, truncated, env.time, env.bar.value))
+        if done or truncated:
+            env.reset()
+    return rows
+
+
+def test_kernel_matches_ticks():
+    # GameEnv with the kernel against the tick-by-tick step, bit for bit
+    for physics_ticks in (1, 4):
+        expected = rollout(None, physics_ticks)
+        actual = rollout(run_block_python, physics_ticks)
+        assert len(expected) == len(actual)
+        for (obs, reward, *rest), (obs_k, reward_k, *rest_k) in zip(expected, actual):
+            assert np.array_equal(obs, obs_k)
+            assert reward == reward_k
+            assert rest == rest_k
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from multi_agent_env import MultiGameEnv
+
+
+def make_env(n_agents=2):
+    env = MultiGameEnv("configs/game_config.yml", n_agents=n_agents)
+    env.reset(seed=0)
+    return env
+
+
+def test_parallel_api():
+    parallel_test = pytest.importorskip("pettingzoo.test")
+    parallel_test.parallel_api_test(MultiGameEnv("configs/game_config.yml", n_agents=3), num_cycles=1000)
+
+
+def test_winner_closest_plane():
+    env = make_env(3)
+    hit = np.array([True, True, True])
+    # the closest plane wins whatever the rotating priority says
+    for ticks in range(3):
+        env.ticks = ticks
+        assert env._winner(hit, np.array([5.0, 2.0, 9.0])) == 1
+    assert env._winner(np.array([True, False, True]), np.array([5.0, 0.0, 9.0])) == 0
+
+
+def test_winner_tie_rotates():
+    env = make_env(3)
+    hit = np.array([True, True, True])
+    dist = np.full(3, 4.0)
+    # exact ties go to plane ticks % n_agents, or the next one after it that hit
+    winners = []
+    for ticks in range(6):
+        env.ticks = ticks
+        winners.append(int(env._winner(hit, dist)))
+    assert winners == [0, 1, 2, 0, 1, 2]
+    # planes that did not hit are skipped, not given the turn
+    env.ticks = 2
+    assert env._winner(np.array([True, True, False]), dist) == 0
+
+
+def test_tied_planes_alternate_on_the_star():
+    # two planes flying the same course reach every star at the same distance, so the
+    # stars alternate between them instead of always going to plane_0
+    env = make_env(2)
+    env.action_repeat = env.physics_ticks = 1
+    for _ in range(4):
+        env.target_pos[:] = env.pos[0]
+        env.step({"plane_0": 0, "plane_1": 0})
+    assert env.score.tolist() == [2, 2]
+    assert env.pos[0].tolist() == env.pos[1].tolist()
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from gym_env import GameEnv
+from kernel import run_block_python
+from planning import SPAWN, STATE_SIZE, rollout_batch, states_obs
+from spawn import SpawnQueue
+
+
+def midgame_env(seed=3, n_steps=400, kernel=None):
+    # an episode some stars in, so the spawn stream has been drawn from
+    env = GameEnv("configs/game_config.yml")
+    env.kernel = kernel
+    env.reset(seed=seed)
+    for action in np.random.default_rng(seed).integers(5, size=n_steps):
+        env.step(action)
+    assert env.player.score > 0
+    return env
+
+
+def test_spawn_queue_round_trip():
+    # mid-batch, at the end of a batch and before the first draw
+    for n_taken in (10, 64, 0):
+        queue = SpawnQueue([np.random.default_rng(5)])
+        for _ in range(n_taken):
+            queue.next()
+        state = queue.get_state().copy()
+        expected = [queue.next().tolist() for _ in range(150)]
+        fresh = SpawnQueue([np.random.default_rng(99)])
+        fresh.set_state(state)
+        assert [fresh.next().tolist() for _ in range(150)] == expected
+
+
+def test_state_round_trip():
+    env = midgame_env()
+    state = env.get_state().copy()
+    assert state.shape == (STATE_SIZE,)
+    # the uint64 spawn words survive the float64 row bit for bit
+    assert np.array_equal(state[SPAWN].view(np.uint64), env.spawns.get_state())
+
+    expected = [env.step(action) for action in (1, 3, 3, 0, 4) * 40]
+    env.set_state(state.copy())
+    assert np.array_equal(env.get_state().view(np.uint64), state.view(np.uint64))
+
+    other = midgame_env(seed=7)
+    other.set_state(state)
+    for (obs, reward, done, truncated, _), action in zip(expected, (1, 3, 3, 0, 4) * 40):
+        obs_o, reward_o, done_o, truncated_o, _ = other.step(action)
+        assert np.array_equal(obs, obs_o)
+        assert (reward, done, truncated) == (reward_o, done_o, truncated_o)
+
+
+@pytest.mark.parametrize("kernel", [None, run_block_python])
+def test_rollout_matches_sequential(kernel, n_branches=32, horizon=300):
+    # rollout_batch against set_state + step per branch, tick by tick or through the
+    # kernel: rewards, flags and final states are identical, down to the last bit
+    env = midgame_env(kernel=kernel)
+    root = env.get_state().copy()
+    actions = np.random.default_rng(0).integers(5, size=(n_branches, horizon))
+
+    rewards, terminated, truncated, states = rollout_batch(env, np.repeat(root[None], n_branches, axis=0), actions)
+
+    for branch in range(n_branches):
+        env.set_state(root)
+        for step in range(horizon):
+            obs, reward, done, trunc, _ = env.step(actions[branch, step])
+            assert reward == rewards[branch, step]
+            if done or trunc:
+                break
+        assert not rewards[branch, step + 1:].any()
+        assert (done, trunc) == (terminated[branch], truncated[branch])
+        assert np.array_equal(env.get_state().view(np.uint64), states[branch].view(np.uint64))
+        assert np.array_equal(states_obs(states[branch])[0], obs)
+    assert truncated.any()
+
+
+def test_rollout_refuses_fast_step():
+    env = midgame_env()
+    env.fast_step = True
+    with pytest.raises(ValueError):
+        rollout_batch(env, env.get_state(), np.zeros((1, 5), dtype=np.int64))
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+# matplotlib's "gist_rainbow" control points, (position, (r, g, b))
+GIST_RAINBOW = (
+    (0.000, (1.00, 0.00, 0.16)),
+    (0.030, (1.00, 0.00, 0.00)),
+    (0.215, (1.00, 1.00, 0.00)),
+    (0.400, (0.00, 1.00, 0.00)),
+    (0.586, (0.00, 1.00, 1.00)),
+    (0.770, (0.00, 0.00, 1.00)),
+    (0.954, (1.00, 0.00, 1.00)),
+    (1.000, (1.00, 0.00, 0.75)),
+)
+
+
+def colormap_lut(data=GIST_RAINBOW, n=256):
+    # the same n-entry table LinearSegmentedColormap builds, as 0-255 ints,
+    # so cmap(i) needs neither matplotlib nor a per-frame lookup
+    x = np.array([pos for pos, _ in data]) * (n - 1)
+    colors = np.array([color for _, color in data])
+    xind = (n - 1) * np.linspace(0, 1, n)
+    ind = np.searchsorted(x, xind)[1:-1]
+    distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+    lut = np.concatenate([
+        colors[:1],
+        distance[:, None] * (colors[ind] - colors[ind - 1]) + colors[ind - 1],
+        colors[-1:],
+    ])
+    return (255 * np.clip(lut, 0.0, 1.0)).astype(np.int64)
+
+
+def render_arc(color, radius, width, end_angle):
+    # antialiased arc as a premultiplied RGBA surface; cv2 is only needed here
+    import cv2
+
+    circle_image = np.zeros((radius*2+4, radius*2+4, 4), dtype = np.uint8)
+    circle_image = cv2.ellipse(circle_image, (radius+2, radius+2),
+        (radius-width//2, radius-width//2), 0, 0, end_angle, (*color, 255), width, lineType=cv2.LINE_AA)
+    arc = pygame.image.frombuffer(circle_image.flatten(), (radius*2+4, radius*2+4), 'RGBA')
+    if pygame.display.get_surface() is not None:
+        # in the display's pixel format the premultiplied blit is ~15x cheaper
+        return arc.convert_alpha()
+    return arc.copy()
+
+
+class CountdownTimer:
+    # countdown ring plus mm:ss label; arcs are rendered once per
+    # (angle step, color) and the label once per displayed second
+
+    def __init__(self, time_limit, font, center=(70, 700), radius=50, width=5, resolution=1.0, max_arcs=512):
+        self.time_limit = time_limit
+        self.font = font
+        self.center = center
+        self.radius = radius
+        self.width = width
+        self.resolution = resolution
+        self.max_arcs = max_arcs
+
+        self.lut = [tuple(int(c) for c in color) for color in colormap_lut()]
+        self.arcs = OrderedDict()
+        self.label_value = None
+        self.label = None
+        self.label_box = None
+        self.rect = pygame.Rect(0, 0, radius*2+4, radius*2+4)
+        self.rect.center = center
+
+    def get_arc(self, countdown):
+        color = self.lut[int(100*countdown/self.time_limit)]
+        step = int(round(360 * countdown / self.time_limit / self.resolution))
+        key = (step, color)
+        arc = self.arcs.get(key)
+        if arc is None:
+            arc = render_arc(color, self.radius, self.width, step * self.resolution)
+            self.arcs[key] = arc
+            if len(self.arcs) > self.max_arcs:
+                self.arcs.popitem(last=False)
+        else:
+            self.arcs.move_to_end(key)
+        return arc
+
+    def get_label(self, countdown):
+        total_time = round(countdown)
+        if total_time != self.label_value:
+            minutes = total_time // 60
+            seconds = total_time % 60
+            self.label = self.font.render(f"{minutes:02}:{seconds:02}", True, (0, 0, 0))
+            self.label_box = self.label.get_rect()
+            self.label_box.center = self.center
+            self.label_value = total_time
+        return self.label, self.label_box
+
+    def sprites(self, t):
+        # (arc, label, label box) shown at time t; both surfaces are cached, so they are
+        # the same objects for as long as the drawing does not change
+        countdown = self.time_limit - (t / 1000)
+        return (self.get_arc(countdown), *self.get_label(countdown))
+
+    def draw(self, screen, t):
+        arc, label, label_box = self.sprites(t)
+        screen.blit(arc, self.rect, special_flags=pygame.BLEND_PREMULTIPLIED)
+        screen.blit(label, label_box)
@@ -1,29 +1,91 @@
 import os
 
-from stable_baselines3 import DQN
-from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import CheckpointCallback
+from argparse import ArgumentParser
+from functools import partial
+from importlib import import_module
 
-from gym_env import GameEnv
+from env_worker import make_env
 
-# Create log dir
-log_dir = "logs/"
-os.makedirs(log_dir, exist_ok=True)
+# stable_baselines3 (and torch) are imported on demand: worker processes re-import
+# this module as __mp_main__ and only need make_env
+ALGOS = {"dqn": "DQN", "ppo": "PPO", "a2c": "A2C"}
 
-# Create and wrap the environment
-env = GameEnv("configs/game_config.yml", False)
-env = Monitor(env, log_dir)
 
-# Create DQN agent
-model = DQN("MlpPolicy", env, verbose=1, tensorboard_log=log_dir)
+def parse_args():
 
-# Create checkpoint callback
-checkpoint_callback = CheckpointCallback(
-    save_freq=100000, save_path=log_dir, name_prefix="rl_model_v0"
-)
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=str,
+        required=False,
+        default="configs/game_config.yml"
+    )
+    parser.add_argument("--algo", type=str, choices=sorted(ALGOS), default="dqn")
+    parser.add_argument("--timesteps", type=int, default=10000000)
+    parser.add_argument("--n-envs", type=int, default=1, help="number of GameEnv worker processes")
+    parser.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="step all --n-envs episodes in-process with VecGameEnv instead of worker processes"
+    )
+    parser.add_argument("--prefix", type=str, default="rl_model_v0", help="checkpoint name prefix")
+    parser.add_argument("--save-freq", type=int, default=100000, help="checkpoint every N env-steps")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--log-dir", type=str, default="logs/")
 
-# Train the agent
-model.learn(
-    total_timesteps=10000000,
-    callback=[checkpoint_callback]
-)
+    return parser.parse_args()
+
+
+def build_env(args):
+    from stable_baselines3.common.monitor import Monitor
+    from stable_baselines3.common.vec_env import VecMonitor
+
+    if args.vectorized:
+        from vec_env import VecGameEnv
+
+        env = VecGameEnv(args.config, num_envs=args.n_envs)
+        return VecMonitor(env, args.log_dir)
+    if args.n_envs == 1:
+        return Monitor(make_env(args.config), args.log_dir)
+    from shm_vec_env import ShmSubprocVecEnv
+
+    env = ShmSubprocVecEnv([partial(make_env, args.config) for _ in range(args.n_envs)])
+    return VecMonitor(env, args.log_dir)
+
+
+def main():
+
+    args = parse_args()
+    from stable_baselines3.common.callbacks import CheckpointCallback
+
+    from shm_vec_env import ShmSubprocVecEnv, WorkerThroughputCallback
+
+    # Create log dir
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    # Create and wrap the environment
+    env = build_env(args)
+
+    # Create agent
+    algo = getattr(import_module("stable_baselines3"), ALGOS[args.algo])
+    model = algo("MlpPolicy", env, verbose=1, tensorboard_log=args.log_dir, seed=args.seed)
+
+    # Create checkpoint callback, save_freq counts vectorized steps
+    callbacks = [
+        CheckpointCallback(
+            save_freq=max(args.save_freq // model.n_envs, 1), save_path=args.log_dir, name_prefix=args.prefix
+        )
+    ]
+    if isinstance(model.get_env().unwrapped, ShmSubprocVecEnv):
+        callbacks.append(WorkerThroughputCallback(log_freq=max(10000 // model.n_envs, 1)))
+
+    # Train the agent
+    model.learn(
+        total_timesteps=args.timesteps,
+        callback=callbacks
+    )
+    env.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import numpy as np
+
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from config import load_config
+from observation import OBS_SIZE, write_obs_batch
+from spawn import SpawnQueue
+
+
+class VecGameEnv(VecEnv):
+
+    def __init__(self, config_file, num_envs=8) -> None:
+
+        self.config = load_config(config_file)
+
+        self.screen_size = self.config["view"]["width"], self.config["view"]["height"]
+        self.fps = self.config["game"]["fps"]
+        self.time_limit = self.config["game"]["time_limit"]
+        self.render_mode = None
+
+        player_cfg = self.config["player"]
+        self.init_pos = np.array(player_cfg["init_pos"], dtype=np.float64)
+        self.init_speed = player_cfg["init_speed"]
+        self.init_angle = player_cfg["init_angle"]
+        self.interval = [player_cfg["min_speed"], player_cfg["max_speed"]]
+        self.speed_delta = player_cfg["speed_delta"]
+        self.angle_delta = player_cfg["angle_delta"]
+
+        self.target_radius = 40.0
+        self.pickup_radius = 40.0
+        env_config = self.config.get("env", {})
+        self.action_repeat = env_config.get("action_repeat", 5)
+        self.physics_ticks = env_config.get("physics_ticks", 1)
+
+        # structure-of-arrays state, one row per parallel episode
+        self.pos = np.zeros((num_envs, 2), dtype=np.float64)
+        self.speed = np.zeros(num_envs, dtype=np.float64)
+        self.angle = np.zeros(num_envs, dtype=np.float64)
+        self.fuel = np.zeros(num_envs, dtype=np.float64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.time = np.zeros(num_envs, dtype=np.float64)
+        self.target_pos = np.zeros((num_envs, 2), dtype=np.float64)
+        self.pickup_pos = np.zeros((num_envs, 2), dtype=np.float64)
+
+        self.buf_obs = np.zeros((num_envs, OBS_SIZE), dtype=np.float32)
+        self.buf_rews = np.zeros(num_envs, dtype=np.float32)
+        self.buf_dones = np.zeros(num_envs, dtype=bool)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+
+        # one respawn stream per env, reseeded by reset() after seed()
+        self.spawns = SpawnQueue.from_seed(None, num_envs)
+
+        super(VecGameEnv, self).__init__(
+            num_envs,
+            spaces.Box(low=-np.inf, high=np.inf, shape=(OBS_SIZE,)),
+            spaces.Discrete(5)
+        )
+
+    def _reset_envs(self, idx):
+        self.pos[idx] = self.init_pos
+        self.speed[idx] = self.init_speed
+        self.angle[idx] = self.init_angle
+        self.fuel[idx] = 100
+        self.score[idx] = 0
+        self.time[idx] = 0.0
+        self.target_pos[idx] = (100, 100)
+        self.pickup_pos[idx] = (600, 600)
+
+    def _respawn(self, positions, hit):
+        if hit.any():
+            positions[hit] = self.spawns.take(np.flatnonzero(hit))
+
+    def _get_obs(self, idx=slice(None), out=None):
+        if out is None:
+            out = np.empty((len(self.angle[idx]), OBS_SIZE), dtype=np.float32)
+        return write_obs_batch(
+            out, self.angle[idx], self.speed[idx], self.pos[idx], self.target_pos[idx], self.pickup_pos[idx], self.fuel[idx]
+        )
+
+    def reset(self):
+        if any(seed is not None for seed in self._seeds):
+            # same stream as GameEnv.reset(seed=seed) for each env's seed
+            self.spawns = SpawnQueue([np.random.default_rng(seed) for seed in self._seeds])
+        self._reset_seeds()
+        self._reset_options()
+
+        self._reset_envs(slice(None))
+        return self._get_obs(out=self.buf_obs).copy()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self.actions
+        width, height = self.screen_size
+        dt = 1 / self.fps
+
+        speed_step = np.where(actions == 1, self.speed_delta, 0.0)
+        speed_step -= np.where(actions == 2, self.speed_delta, 0.0)
+        angle_step = np.where(actions == 3, -self.angle_delta, 0.0)
+        angle_step += np.where(actions == 4, self.angle_delta, 0.0)
+
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        active = np.ones(self.num_envs, dtype=bool)
+        terminated = np.zeros(self.num_envs, dtype=bool)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        terminal_obs = np.empty((self.num_envs, OBS_SIZE), dtype=np.float32)
+
+        for _ in range(self.action_repeat):
+            np.clip(self.speed + speed_step, self.interval[0], self.interval[1], out=self.speed)
+            np.mod(self.angle + angle_step, 360, out=self.angle)
+            heading = np.deg2rad(self.angle)
+            velocity_x = self.speed * np.cos(heading)
+            velocity_y = self.speed * np.sin(heading)
+            for _ in range(self.physics_ticks):
+                self.time[active] += dt
+
+                self.pos[:, 0] += velocity_x
+                self.pos[:, 1] += velocity_y
+                np.mod(self.pos[:, 0], width, out=self.pos[:, 0])
+                np.mod(self.pos[:, 1], height, out=self.pos[:, 1])
+
+                to_target = self.pos - self.target_pos
+                to_pickup = self.pos - self.pickup_pos
+                dist = np.sqrt(np.einsum("ij,ij->i", to_target, to_target))
+                dist_pickup = np.sqrt(np.einsum("ij,ij->i", to_pickup, to_pickup))
+
+                mask = active.astype(np.float64)
+                rewards += dt * mask
+                rewards -= dist / 500 / self.fps * mask
+                rewards -= dist_pickup / 500 / self.fps * mask
+
+                hit_target = (dist <= self.target_radius) & active
+                self.score += hit_target
+                self._respawn(self.target_pos, hit_target)
+                rewards += 20 * hit_target
+
+                hit_pickup = (dist_pickup <= self.pickup_radius) & active
+                self.fuel[hit_pickup] = np.minimum(100, self.fuel[hit_pickup] + 20)
+                self._respawn(self.pickup_pos, hit_pickup)
+                rewards += 10 * hit_pickup
+
+                t = (self.speed - self.interval[0]) / (self.interval[1] - self.interval[0])
+                fuel_delta = (1 - t) * 0.01 + t * 0.1
+                np.clip(self.fuel - fuel_delta, 0, 100, out=self.fuel)
+
+                time_out = active & (self.time > self.time_limit)
+                fuel_out = active & ~time_out & (self.fuel <= 0)
+                finished = time_out | fuel_out
+                if finished.any():
+                    terminated |= time_out
+                    truncated |= fuel_out
+                    terminal_obs[finished] = self._get_obs(finished)
+                    active &= ~finished
+                    if not active.any():
+                        break
+            if not active.any():
+                break
+
+        dones = terminated | truncated
+        self.buf_rews[:] = rewards
+        self.buf_dones[:] = dones
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            for env_idx in np.flatnonzero(dones):
+                infos[env_idx]["terminal_observation"] = terminal_obs[env_idx].copy()
+                # GameEnv reports the time limit as `done` and running out of fuel as `truncated`
+                infos[env_idx]["TimeLimit.truncated"] = bool(truncated[env_idx])
+            self._reset_envs(dones)
+
+        self._get_obs(out=self.buf_obs)
+        return self.buf_obs.copy(), self.buf_rews.copy(), self.buf_dones.copy(), infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]